@@ -1,7 +1,18 @@
+import argparse
+import asyncio
+import io
+import math
+import queue
+import signal
+import sys
+import threading
+import aiohttp
 import pyaudio
 import openai
 import wave
 import requests
+from array import array
+from collections import deque
 
 ######### UPDATE THESE ############
 
@@ -14,66 +25,316 @@ openai.api_key = "sk-...."
 ###################################
 
 
-CHUNK = 1024
 WIDTH = 2
 CHANNELS = 1
-RATE = 44100
-RECORD_SECONDS = 10
-WAVE_OUTPUT_FILENAME = "output.wav"
+RATE = 16000  # Whisper works on 16 kHz mono, anything more is only extra upload
+CHUNK = 480  # 30 ms per read
+RECORD_SECONDS = 10  # Upper bound on a single command
 
-p = pyaudio.PyAudio()
+# End-of-speech detection
+CALIBRATION_SECONDS = 0.3  # Background noise is measured before listening for speech
+MIN_ENERGY = 300  # RMS a chunk needs to count as speech, at least
+NOISE_MULTIPLIER = 3  # ... or this many times the background noise
+MAX_ENERGY = 1500  # ... but never more, in case the speaker was already talking during calibration
+START_TIMEOUT_SECONDS = 5  # Give up if nobody starts speaking
+SILENCE_SECONDS = 0.8  # Silence after speech that ends the command
+PRE_ROLL_SECONDS = 0.3  # Audio kept from before speech started, so the first word isn't clipped
 
-stream = p.open(format=p.get_format_from_width(WIDTH),
-                channels=CHANNELS,
-                rate=RATE,
-                input=True,
-                frames_per_buffer=CHUNK)
+# Daemon mode
+RING_SECONDS = 1  # Audio kept from before the trigger; also used to measure background noise
+OPENAI_API_BASE = "https://api.openai.com/v1"
+PROMPT_ENTITY = "input_text.openassist_prompt"
 
-print("* recording")
 
-frames = []
+def rms(data):
+    """Return the RMS energy of a chunk of 16-bit samples."""
+    samples = array('h', data)
+    if not samples:
+        return 0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
 
-for i in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
-    data = stream.read(CHUNK)
-    frames.append(data)
 
-print("* done recording")
+def chunks_for(seconds):
+    return max(1, int(seconds * RATE / CHUNK))
 
-stream.stop_stream()
-stream.close()
 
-p.terminate()
+def record_fixed(stream, seconds):
+    """Record a fixed number of seconds."""
+    return [stream.read(CHUNK, exception_on_overflow=False) for _ in range(chunks_for(seconds))]
 
-wf = wave.open(WAVE_OUTPUT_FILENAME, 'wb')
-wf.setnchannels(CHANNELS)
-wf.setsampwidth(p.get_sample_size(p.get_format_from_width(WIDTH)))
-wf.setframerate(RATE)
-wf.writeframes(b''.join(frames))
-wf.close()
 
-# Transcribe audio file
-audio_file = open(WAVE_OUTPUT_FILENAME, "rb")
-transcript = openai.Audio.transcribe(model="whisper-1", file=audio_file, response_format="text")
-print(transcript)
+def record_until_silence(read, background=None):
+    """Record from the start of speech until the speaker has been silent for SILENCE_SECONDS.
 
-# Define the URL for the Home Assistant API call
-url = f"{HOME_ASSISTANT_URL}/api/states/input_text.openassist_prompt"
+    read() returns the next chunk. background is audio recorded just before,
+    used instead of listening for CALIBRATION_SECONDS first. Returns an empty
+    list if no speech starts within START_TIMEOUT_SECONDS.
+    """
+    if not background:
+        background = [read() for _ in range(chunks_for(CALIBRATION_SECONDS))]
+    # The median ignores the odd loud chunk, e.g. the key press that triggered the daemon
+    calibration = sorted(rms(data) for data in background)
+    threshold = min(MAX_ENERGY, max(MIN_ENERGY, NOISE_MULTIPLIER * calibration[len(calibration) // 2]))
 
-# Define the headers for the API call
-headers = {
-    "Authorization": f"Bearer {HA_LONG_LIVED_ACCESS_TOKEN}",
-    "content-type": "application/json",
-}
+    pre_roll = deque(background, maxlen=chunks_for(PRE_ROLL_SECONDS))
+    for _ in range(chunks_for(START_TIMEOUT_SECONDS)):
+        data = read()
+        pre_roll.append(data)
+        if rms(data) >= threshold:
+            break
+    else:
+        return []
 
-# Define the data for the API call
-data = {
-    "state": transcript
-}
+    frames = list(pre_roll)
+    silent_chunks = 0
+    while len(frames) < chunks_for(RECORD_SECONDS) and silent_chunks < chunks_for(SILENCE_SECONDS):
+        data = read()
+        frames.append(data)
+        silent_chunks = silent_chunks + 1 if rms(data) < threshold else 0
+    return frames
 
-# Make the API call
-response = requests.post(url, headers=headers, json=data)
 
-# Print the response
-print(response.text)
+def wav_buffer(frames):
+    """Return the frames as an in-memory WAV file ready to upload."""
+    buffer = io.BytesIO()
+    wf = wave.open(buffer, 'wb')
+    wf.setnchannels(CHANNELS)
+    wf.setsampwidth(WIDTH)
+    wf.setframerate(RATE)
+    wf.writeframes(b''.join(frames))
+    wf.close()
+    buffer.seek(0)
+    # The upload takes its file name, and with it the audio format, from here
+    buffer.name = "speech.wav"
+    return buffer
 
-print(response.json())
+
+def send_prompt(transcript):
+    """Write the transcript to input_text.openassist_prompt."""
+    # Define the URL for the Home Assistant API call
+    url = f"{HOME_ASSISTANT_URL}/api/states/input_text.openassist_prompt"
+
+    # Define the headers for the API call
+    headers = {
+        "Authorization": f"Bearer {HA_LONG_LIVED_ACCESS_TOKEN}",
+        "content-type": "application/json",
+    }
+
+    # Define the data for the API call
+    data = {
+        "state": transcript
+    }
+
+    # Make the API call
+    response = requests.post(url, headers=headers, json=data)
+
+    # Print the response
+    print(response.text)
+
+    print(response.json())
+
+
+def main(args):
+    p = pyaudio.PyAudio()
+
+    stream = p.open(format=p.get_format_from_width(WIDTH),
+                    channels=CHANNELS,
+                    rate=RATE,
+                    input=True,
+                    frames_per_buffer=CHUNK)
+
+    if args.fixed_seconds:
+        print("* recording")
+        frames = record_fixed(stream, args.fixed_seconds)
+    else:
+        def read():
+            return stream.read(CHUNK, exception_on_overflow=False)
+
+        # Measure the background noise before asking the user to speak
+        background = [read() for _ in range(chunks_for(CALIBRATION_SECONDS))]
+        print("* recording")
+        frames = record_until_silence(read, background)
+
+    print(f"* done recording ({len(frames) * CHUNK / RATE:.1f}s)")
+
+    stream.stop_stream()
+    stream.close()
+
+    p.terminate()
+
+    if not frames:
+        print("* no speech detected")
+        return
+
+    # Transcribe the audio straight from memory
+    transcript = openai.Audio.transcribe(model="whisper-1", file=wav_buffer(frames), response_format="text")
+    print(transcript)
+
+    send_prompt(transcript)
+
+
+class AudioRing:
+    """Keep the microphone open, remembering the last RING_SECONDS of audio."""
+
+    def __init__(self, p):
+        self._history = deque(maxlen=chunks_for(RING_SECONDS))
+        self._live = None
+        self._lock = threading.Lock()
+        self.stream = p.open(format=p.get_format_from_width(WIDTH),
+                             channels=CHANNELS,
+                             rate=RATE,
+                             input=True,
+                             frames_per_buffer=CHUNK,
+                             stream_callback=self._callback)
+
+    def _callback(self, data, frame_count, time_info, status):
+        # Runs on PyAudio's thread for every chunk
+        with self._lock:
+            self._history.append(data)
+            if self._live is not None:
+                self._live.put(data)
+        return None, pyaudio.paContinue
+
+    def record(self):
+        """Record a command, starting from the buffered audio (blocking)."""
+        live = queue.Queue()
+        with self._lock:
+            background = list(self._history)
+            self._live = live
+        try:
+            return record_until_silence(live.get, background)
+        finally:
+            with self._lock:
+                self._live = None
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+
+
+class HomeAssistantConnection:
+    """A persistent, authenticated Home Assistant websocket connection."""
+
+    def __init__(self, session):
+        self._session = session
+        self._ws = None
+        self._id = 0
+
+    async def async_connect(self):
+        url = HOME_ASSISTANT_URL.replace("http", "ws", 1) + "/api/websocket"
+        ws = await self._session.ws_connect(url, heartbeat=30)
+        await ws.receive_json()  # auth_required
+        await ws.send_json({"type": "auth", "access_token": HA_LONG_LIVED_ACCESS_TOKEN})
+        message = await ws.receive_json()
+        if message.get("type") != "auth_ok":
+            await ws.close()
+            raise ConnectionError(f"Home Assistant authentication failed: {message.get('message')}")
+        self._ws = ws
+        print("* connected to Home Assistant")
+
+    async def async_send_prompt(self, transcript):
+        """Set input_text.openassist_prompt to the transcript, reconnecting once if the connection dropped."""
+        for attempt in range(2):
+            try:
+                if self._ws is None or self._ws.closed:
+                    await self.async_connect()
+                self._id += 1
+                await self._ws.send_json({
+                    "id": self._id,
+                    "type": "call_service",
+                    "domain": "input_text",
+                    "service": "set_value",
+                    "service_data": {"value": transcript},
+                    "target": {"entity_id": PROMPT_ENTITY},
+                })
+                while True:
+                    message = await self._ws.receive_json()
+                    if message.get("id") == self._id:
+                        break
+            except (aiohttp.ClientError, TypeError) as err:
+                # receive_json raises TypeError when the socket closes under us
+                self._ws = None
+                if attempt:
+                    raise ConnectionError(f"Lost the Home Assistant connection: {err}") from err
+                continue
+            if not message.get("success"):
+                print(f"* Home Assistant refused the prompt: {message.get('error')}")
+            return message
+
+    async def async_close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+
+async def async_transcribe(session, frames):
+    """Transcribe the frames with Whisper over the pooled session."""
+    form = aiohttp.FormData()
+    form.add_field("model", "whisper-1")
+    form.add_field("response_format", "text")
+    form.add_field("file", wav_buffer(frames).getvalue(), filename="speech.wav", content_type="audio/wav")
+    async with session.post(f"{OPENAI_API_BASE}/audio/transcriptions",
+                            headers={"Authorization": f"Bearer {openai.api_key}"},
+                            data=form) as response:
+        response.raise_for_status()
+        return (await response.text()).strip()
+
+
+async def async_daemon():
+    """Listen continuously and send a command each time Enter is pressed or SIGUSR1 arrives."""
+    loop = asyncio.get_running_loop()
+    triggers = asyncio.Queue()
+
+    def on_stdin():
+        if not sys.stdin.readline():
+            # stdin closed (e.g. running as a service), rely on SIGUSR1
+            loop.remove_reader(sys.stdin)
+            return
+        triggers.put_nowait("Enter")
+
+    loop.add_signal_handler(signal.SIGUSR1, triggers.put_nowait, "SIGUSR1")
+    loop.add_reader(sys.stdin, on_stdin)
+
+    p = pyaudio.PyAudio()
+    ring = AudioRing(p)
+    async with aiohttp.ClientSession() as session:
+        home_assistant = HomeAssistantConnection(session)
+        try:
+            await home_assistant.async_connect()
+            print("* listening, press Enter or send SIGUSR1 to give a command")
+            while True:
+                source = await triggers.get()
+                print(f"* recording ({source})")
+                frames = await loop.run_in_executor(None, ring.record)
+                # Triggers that arrived while recording belong to this command
+                while not triggers.empty():
+                    triggers.get_nowait()
+                if not frames:
+                    print("* no speech detected")
+                    continue
+                print(f"* done recording ({len(frames) * CHUNK / RATE:.1f}s)")
+                try:
+                    transcript = await async_transcribe(session, frames)
+                    print(transcript)
+                    await home_assistant.async_send_prompt(transcript)
+                except (aiohttp.ClientError, ConnectionError) as err:
+                    print(f"* failed to send the command: {err}")
+        finally:
+            await home_assistant.async_close()
+            ring.close()
+            p.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record a voice command and send it to OpenAssist.")
+    parser.add_argument("--fixed-seconds", type=float, default=0,
+                        help="record this many seconds instead of stopping when the speaker is done")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and record a command on Enter or SIGUSR1")
+    args = parser.parse_args()
+    if args.daemon:
+        try:
+            asyncio.run(async_daemon())
+        except KeyboardInterrupt:
+            pass
+    else:
+        main(args)
@@ -0,0 +1,426 @@
+"""Offline benchmark for the OpenAssist integration.
+
+Starts a local stub server that emulates the OpenAI embeddings endpoint, the
+Pinecone controller/query/upsert endpoints, the MindsDB login/SQL endpoints and
+the OpenAI chat completions endpoint, streamed or not (each with configurable
+injected latency), drives async_setup and the
+OpenAssist sensor against a minimal fake hass, and reports index build
+throughput and end-to-end prompt latency percentiles.
+
+Requires homeassistant and aiohttp to be importable:
+
+    python benchmarks/bench_openassist.py --sizes 100 1000 10000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components"))
+
+from homeassistant.const import (  # noqa: E402
+    EVENT_HOMEASSISTANT_CLOSE,
+    EVENT_HOMEASSISTANT_STOP,
+    EVENT_STATE_CHANGED,
+)
+
+from openassist import DOMAIN, DOCS_DIR, ENTITY_REGISTRY_PATH, async_setup  # noqa: E402
+from openassist.metrics import percentile  # noqa: E402
+from openassist.sensor import OpenAssistSensor  # noqa: E402
+
+ENTITY_DOMAINS = ("light", "switch", "fan", "cover", "sensor")
+ROOMS = ("kitchen", "loft", "office", "garage", "bedroom", "hallway", "lounge", "garden")
+
+PROMPTS = (
+    "turn off the kitchen lights",
+    "is the garage door open",
+    "turn on the loft light",
+    "set the office fan to 50%",
+    "what's the temperature in the bedroom",
+)
+
+STUB_RESPONSE = json.dumps({
+    "actions": [
+        {"domain": "light", "service": "turn_off", "entity_id": "light.kitchen_0", "data": {}},
+        {"domain": "switch", "service": "turn_off", "entity_id": "switch.kitchen_1", "data": {}},
+    ],
+    "message": "The kitchen lights are off.",
+})
+
+
+class StubServer:
+    """Local stand-in for the OpenAI, Pinecone and MindsDB HTTP APIs."""
+
+    def __init__(self, openai_latency, pinecone_latency, mindsdb_latency, dimension):
+        self._openai_latency = openai_latency
+        self._pinecone_latency = pinecone_latency
+        self._mindsdb_latency = mindsdb_latency
+        # A small pool of random vectors keeps the stub itself cheap
+        rnd = random.Random(0)
+        self._pool = [[rnd.uniform(-1, 1) for _ in range(dimension)] for _ in range(64)]
+        self.vectors = {}
+        self.requests = defaultdict(int)
+        self._runner = None
+        self.url = None
+
+    def _vector(self, text):
+        return self._pool[hashlib.md5(text.encode("utf-8")).digest()[0] % len(self._pool)]
+
+    async def _embeddings(self, request):
+        self.requests["openai_embeddings"] += 1
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(self._openai_latency)
+        return web.json_response({
+            "data": [{"index": i, "embedding": self._vector(text)} for i, text in enumerate(inputs)],
+        })
+
+    async def _list_indexes(self, request):
+        self.requests["pinecone_controller"] += 1
+        await asyncio.sleep(self._pinecone_latency)
+        return web.json_response(["entities"])
+
+    async def _create_index(self, request):
+        self.requests["pinecone_controller"] += 1
+        await asyncio.sleep(self._pinecone_latency)
+        return web.Response(status=201)
+
+    async def _describe_index(self, request):
+        self.requests["pinecone_controller"] += 1
+        await asyncio.sleep(self._pinecone_latency)
+        return web.json_response({"status": {"state": "Ready", "ready": True, "host": request.host}})
+
+    async def _describe_index_stats(self, request):
+        self.requests["pinecone_stats"] += 1
+        await asyncio.sleep(self._pinecone_latency)
+        return web.json_response({"dimension": len(self._pool[0]), "totalVectorCount": len(self.vectors)})
+
+    async def _upsert(self, request):
+        self.requests["pinecone_upsert"] += 1
+        body = await request.json()
+        for vector in body["vectors"]:
+            self.vectors[vector["id"]] = vector.get("metadata", {})
+        await asyncio.sleep(self._pinecone_latency)
+        return web.json_response({"upsertedCount": len(body["vectors"])})
+
+    async def _delete(self, request):
+        self.requests["pinecone_delete"] += 1
+        body = await request.json()
+        for vector_id in body.get("ids", []):
+            self.vectors.pop(vector_id, None)
+        await asyncio.sleep(self._pinecone_latency)
+        return web.json_response({})
+
+    async def _query(self, request):
+        self.requests["pinecone_query"] += 1
+        body = await request.json()
+        await asyncio.sleep(self._pinecone_latency)
+        matches = [
+            {"id": vector_id, "score": 0.9 - i * 0.01, "metadata": metadata}
+            for i, (vector_id, metadata) in enumerate(list(self.vectors.items())[:body.get("topK", 5)])
+        ]
+        return web.json_response({"matches": matches})
+
+    async def _login(self, request):
+        self.requests["mindsdb_login"] += 1
+        await asyncio.sleep(self._mindsdb_latency)
+        response = web.json_response({})
+        response.set_cookie("session", "bench")
+        return response
+
+    async def _sql_query(self, request):
+        self.requests["mindsdb_query"] += 1
+        await asyncio.sleep(self._mindsdb_latency)
+        return web.json_response({"data": [[STUB_RESPONSE]]})
+
+    async def _chat_completions(self, request):
+        self.requests["openai_chat"] += 1
+        body = await request.json()
+        if not body.get("stream"):
+            await asyncio.sleep(self._mindsdb_latency)
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": STUB_RESPONSE}}]})
+        # Spread the latency over the chunks, as a model generating tokens would
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunks = [STUB_RESPONSE[i:i + 8] for i in range(0, len(STUB_RESPONSE), 8)]
+        for chunk in chunks:
+            await asyncio.sleep(self._mindsdb_latency / len(chunks))
+            payload = json.dumps({"choices": [{"delta": {"content": chunk}}]})
+            await response.write(f"data: {payload}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/embeddings", self._embeddings)
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        app.router.add_get("/databases", self._list_indexes)
+        app.router.add_post("/databases", self._create_index)
+        app.router.add_get("/databases/{name}", self._describe_index)
+        app.router.add_post("/describe_index_stats", self._describe_index_stats)
+        app.router.add_post("/vectors/upsert", self._upsert)
+        app.router.add_post("/vectors/delete", self._delete)
+        app.router.add_post("/query", self._query)
+        app.router.add_post("/cloud/login", self._login)
+        app.router.add_post("/api/sql/query", self._sql_query)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+class FakeBus:
+    """Event bus that runs listeners the way Home Assistant does, as tasks."""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._listeners = defaultdict(list)
+
+    def async_listen(self, event_type, listener):
+        self._listeners[event_type].append(listener)
+        return lambda: self._listeners[event_type].remove(listener)
+
+    def async_listen_once(self, event_type, listener):
+        return self.async_listen(event_type, listener)
+
+    def async_fire(self, event_type, event_data=None):
+        event = SimpleNamespace(event_type=event_type, data=event_data or {})
+        for listener in list(self._listeners[event_type]):
+            result = listener(event)
+            if asyncio.iscoroutine(result):
+                self._hass.async_create_task(result)
+
+
+class FakeStates:
+    """State machine that only records what was written."""
+
+    def __init__(self):
+        self.states = {}
+        self.listeners = []
+
+    def async_set(self, entity_id, state, attributes=None, *args, **kwargs):
+        self.states[entity_id] = (state, attributes or {})
+        for listener in self.listeners:
+            listener(entity_id, state)
+
+    def get(self, entity_id):
+        return self.states.get(entity_id)
+
+
+class FakeServices:
+    """Service registry that records calls instead of executing them."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def async_call(self, domain, service, service_data=None, blocking=False, **kwargs):
+        self.calls.append((domain, service, service_data))
+        await asyncio.sleep(0)
+
+
+class FakeTemplate:
+    """Template that renders to its source."""
+
+    def __init__(self, template, hass):
+        self._template = template
+
+    def async_render(self, *args, **kwargs):
+        return self._template
+
+
+class FakeHass:
+    """The parts of HomeAssistant the integration touches."""
+
+    def __init__(self, config_dir):
+        self.loop = asyncio.get_running_loop()
+        self.data = {}
+        self.bus = FakeBus(self)
+        self.states = FakeStates()
+        self.services = FakeServices()
+        self.config = SimpleNamespace(config_dir=config_dir, path=lambda *parts: os.path.join(config_dir, *parts))
+        self.helpers = SimpleNamespace(template=SimpleNamespace(Template=FakeTemplate))
+        self._tasks = set()
+
+    def async_create_task(self, target, *args, **kwargs):
+        task = self.loop.create_task(target)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def async_run_hass_job(self, job, *args):
+        result = job.target(*args)
+        if asyncio.iscoroutine(result):
+            return self.async_create_task(result)
+        return None
+
+    async def async_add_executor_job(self, target, *args):
+        return await self.loop.run_in_executor(None, target, *args)
+
+    async def async_block_till_done(self):
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+
+class BenchSensor(OpenAssistSensor):
+    """OpenAssist sensor that signals when a prompt has been handled."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.finished = asyncio.Event()
+
+    def async_write_ha_state(self):
+        self.finished.set()
+
+    def async_schedule_update_ha_state(self, force_refresh=False):
+        self.finished.set()
+
+
+def write_registry(config_dir, size):
+    """Write a core.entity_registry file with size entities."""
+    entities = []
+    for i in range(size):
+        domain = ENTITY_DOMAINS[i % len(ENTITY_DOMAINS)]
+        room = ROOMS[(i // len(ENTITY_DOMAINS)) % len(ROOMS)]
+        entities.append({
+            "entity_id": f"{domain}.{room}_{i}",
+            "original_name": f"{room.title()} {domain.title()} {i}",
+            "name": None,
+            "platform": "bench",
+            "unique_id": f"bench-{i}",
+            "device_id": None,
+            "area_id": room,
+            "aliases": [],
+        })
+    path = os.path.join(config_dir, ENTITY_REGISTRY_PATH)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({"version": 1, "data": {"entities": entities}}, f)
+
+
+def fire_state(hass, entity_id, value):
+    hass.bus.async_fire(EVENT_STATE_CHANGED, {
+        "entity_id": entity_id,
+        "old_state": None,
+        "new_state": SimpleNamespace(entity_id=entity_id, state=value, attributes={}),
+    })
+
+
+async def run_size(size, args):
+    """Benchmark one registry size and return the results."""
+    stub = StubServer(args.openai_latency / 1000, args.pinecone_latency / 1000, args.mindsdb_latency / 1000, args.dimension)
+    await stub.start()
+    try:
+        with tempfile.TemporaryDirectory() as config_dir:
+            write_registry(config_dir, size)
+            os.makedirs(os.path.join(config_dir, DOCS_DIR), exist_ok=True)
+            hass = FakeHass(config_dir)
+            conf = {
+                "openai_key": "bench",
+                "pinecone_key": "bench",
+                "pinecone_env": "bench",
+                "included_domains": ", ".join(ENTITY_DOMAINS),
+                "openai_api_base": f"{stub.url}/v1",
+                "pinecone_controller_url": stub.url,
+                "embedding_cache_size": args.embedding_cache_size,
+            }
+            conf.update(json.loads(args.extra_config))
+
+            start = time.perf_counter()
+            await async_setup(hass, {DOMAIN: conf})
+            setup_seconds = time.perf_counter() - start
+
+            sensor = BenchSensor(
+                "OpenAssist Response", "bench", "bench@example.com", "bench", "bench", "Bench", stub.url,
+                llm_backend=args.llm_backend, stream=not args.no_stream,
+            )
+            sensor.hass = hass
+            await sensor.async_added_to_hass()
+
+            # Index build, from the trigger until the "Ready" state is written
+            build_done = asyncio.Event()
+            hass.states.listeners.append(
+                lambda entity_id, state: state == "Ready" and build_done.set()
+            )
+            start = time.perf_counter()
+            fire_state(hass, "input_text.pinecone_index", "bench")
+            await asyncio.wait_for(build_done.wait(), args.timeout)
+            build_seconds = time.perf_counter() - start
+
+            # Prompts, one at a time, from the input_text write until the sensor updates
+            latencies = []
+            for i in range(args.prompts):
+                sensor.finished.clear()
+                start = time.perf_counter()
+                fire_state(hass, "input_text.openassist_prompt", PROMPTS[i % len(PROMPTS)])
+                await asyncio.wait_for(sensor.finished.wait(), args.timeout)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            stages = hass.data[DOMAIN]["latency"].summary()
+
+            hass.bus.async_fire(EVENT_HOMEASSISTANT_STOP)
+            hass.bus.async_fire(EVENT_HOMEASSISTANT_CLOSE)
+            await sensor.async_will_remove_from_hass()
+            await hass.async_block_till_done()
+    finally:
+        await stub.stop()
+
+    return {
+        "entities": size,
+        "setup_ms": round(setup_seconds * 1000, 1),
+        "build_seconds": round(build_seconds, 2),
+        "build_entities_per_second": round(size / build_seconds, 1),
+        "prompt_p50_ms": round(percentile(latencies, 0.5), 1),
+        "prompt_p95_ms": round(percentile(latencies, 0.95), 1),
+        "prompt_p99_ms": round(percentile(latencies, 0.99), 1),
+        "stages": stages,
+        "requests": dict(stub.requests),
+    }
+
+
+async def main(args):
+    logging.basicConfig(level=args.log_level)
+    results = [await run_size(size, args) for size in args.sizes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'entities':>8} {'setup ms':>9} {'build s':>8} {'ent/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for result in results:
+        print(
+            f"{result['entities']:>8} {result['setup_ms']:>9} {result['build_seconds']:>8} "
+            f"{result['build_entities_per_second']:>8} {result['prompt_p50_ms']:>8} "
+            f"{result['prompt_p95_ms']:>8} {result['prompt_p99_ms']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="registry sizes to benchmark")
+    parser.add_argument("--prompts", type=int, default=50, help="prompts to send per registry size")
+    parser.add_argument("--openai-latency", type=float, default=40, help="injected OpenAI latency (ms)")
+    parser.add_argument("--pinecone-latency", type=float, default=20, help="injected Pinecone latency (ms)")
+    parser.add_argument("--mindsdb-latency", type=float, default=200, help="injected MindsDB / chat completion latency (ms)")
+    parser.add_argument("--llm-backend", choices=("mindsdb", "openai"), default="mindsdb", help="LLM backend of the sensor")
+    parser.add_argument("--no-stream", action="store_true", help="do not stream chat completions with --llm-backend openai")
+    parser.add_argument("--dimension", type=int, default=1536, help="embedding dimension returned by the stub")
+    parser.add_argument("--embedding-cache-size", type=int, default=0, help="prompt embedding cache size (0 disables it)")
+    parser.add_argument("--extra-config", default="{}", help="JSON object merged into the openassist: config")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for a build or prompt")
+    parser.add_argument("--json", action="store_true", help="print the full results as JSON")
+    parser.add_argument("--log-level", default="CRITICAL", help="log level for the integration's logs")
+    asyncio.run(main(parser.parse_args()))
@@ -1,74 +1,295 @@
 import logging
+import importlib.util
 import json
-import openai
-import requests
+import os
 import yaml
 import time
 import asyncio
 import aiohttp
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.helpers.entity_registry import EVENT_ENTITY_REGISTRY_UPDATED
+from homeassistant.helpers.event import async_call_later
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE, EVENT_HOMEASSISTANT_STOP, EVENT_STATE_CHANGED
+from homeassistant.helpers.start import async_at_start
+import homeassistant.helpers.entity_registry as er
+
+from .cache import EmbeddingCache, ResponseCache
+from .documents import DOCUMENT_FIELDS, EntityDocumentBuilder, token_report
+from .embeddings import (
+    DEFAULT_BATCH_WINDOW,
+    DEFAULT_LOCAL_BATCH_SIZE,
+    DEFAULT_LOCAL_EMBEDDING_MODEL,
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_OPENAI_EMBEDDING_MODEL,
+    EMBEDDING_BACKEND_LOCAL,
+    EMBEDDING_BACKEND_OPENAI,
+    EmbeddingBatcher,
+    EmbeddingError,
+    LocalEmbeddings,
+    OpenAIEmbeddings,
+)
+from .intent import FastPathMatcher
+from .lexical import LexicalIndex, adaptive_top_k, fuse_matches
+from .metrics import LatencyTracker, PromptTimer
+from .ratelimit import RequestScheduler
+from .scheduler import PromptScheduler
+from .sync import IndexManifest, content_hash, entity_metadata, registry_entry_to_dict
 
 
 DOMAIN = "openassist"
 EVENT_OPENASSIST_UPDATE = f"{DOMAIN}_update"
+SIGNAL_LATENCY_UPDATED = f"{DOMAIN}_latency_updated"
+SIGNAL_PROMPT_CANCELLED = f"{DOMAIN}_prompt_cancelled"
 
 _LOGGER = logging.getLogger(__name__)
 
-MODEL = "text-embedding-ada-002"
+# Manifests written before the embedding backend was configurable were built with this
+LEGACY_EMBEDDING_KEY = f"{EMBEDDING_BACKEND_OPENAI}:{DEFAULT_OPENAI_EMBEDDING_MODEL}"
+
+OPENAI_API_BASE = "https://api.openai.com/v1"
+PINECONE_CONTROLLER_URL = "https://controller.{environment}.pinecone.io"
 
 index_name = "entities"
 
+# Relative to the Home Assistant config directory
+ENTITY_REGISTRY_PATH = os.path.join(".storage", "core.entity_registry")
+DOCS_DIR = os.path.join("custom_components", DOMAIN, "docs")
+LOCAL_INDEX_FILE = "entity_index"
+EMBEDDING_CACHE_FILE = "embedding_cache.json"
+INDEX_MANIFEST_FILE = "index_manifest.json"
+FILTERED_ENTITIES_FILE = "filtered_entities.json"
+
+RETRIEVAL_BACKEND_PINECONE = "pinecone"
+RETRIEVAL_BACKEND_LOCAL = "local"
+
+DEFAULT_EMBEDDING_BATCH_SIZE = 100
+DEFAULT_UPSERT_BATCH_SIZE = 50
+DEFAULT_PINECONE_HOST_TTL = 3600
+DEFAULT_EMBEDDING_CACHE_SIZE = 256
+DEFAULT_EMBEDDING_CACHE_TTL = 86400
+DEFAULT_LATENCY_WINDOW = 200
+DEFAULT_RESPONSE_CACHE_SIZE = 128
+DEFAULT_RESPONSE_CACHE_TTL = 3600
+DEFAULT_RESPONSE_CACHE_THRESHOLD = 0.99
+DEFAULT_TOP_K = 5
+DEFAULT_MIN_TOP_K = 2
+DEFAULT_MAX_TOP_K = 15
+DEFAULT_DECISIVE_MARGIN = 0.05
+# Only applies while an earlier prompt is still in flight
+DEFAULT_PROMPT_DEBOUNCE = 0
+DEFAULT_MAX_CONCURRENT_PROMPTS = 2
+DEFAULT_PROMPT_QUEUE_SIZE = 5
+DEFAULT_PROMPT_SUPERSEDE_WINDOW = 3
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 10
+DEFAULT_KEEPALIVE_TIMEOUT = 60
+DEFAULT_REQUEST_TIMEOUT = 60
+DEFAULT_CONNECT_TIMEOUT = 10
+
+DEFAULT_OPENAI_RPM = 3000
+DEFAULT_OPENAI_TPM = 1000000
+DEFAULT_OPENAI_MAX_CONCURRENT = 4
+# Pinecone is only bounded by concurrency unless a rate is configured
+DEFAULT_PINECONE_RPM = 0
+DEFAULT_PINECONE_MAX_CONCURRENT = 4
+DEFAULT_MAX_RETRIES = 5
+
+# Seconds to wait for more entity registry changes before syncing the index
+REGISTRY_SYNC_DELAY = 5
+
+DEFAULT_INDEX_READY_TIMEOUT = 600
+DEFAULT_CHECKPOINT_INTERVAL = 30
+# Readiness probes back off exponentially between these delays (seconds)
+PROBE_INITIAL_DELAY = 1
+PROBE_MAX_DELAY = 30
+
 # Function to filter entities by domain
 def filter_entities(entities, domains):
-    filtered_entities = {}
-    for entity in entities:
-        for domain in domains:
-            if entity["entity_id"].startswith(f"{domain}."):
-                filtered_entities[entity["entity_id"]] = entity
-    return filtered_entities
+    domains = set(domains)
+    return {
+        entity["entity_id"]: entity
+        for entity in entities
+        if entity["entity_id"].split(".", 1)[0] in domains
+    }
+
+def load_registry_entities(path):
+    """Read the entities from the entity registry storage file."""
+    with open(path, 'r') as f:
+        return json.load(f)["data"]["entities"]
 
 def write_filtered_entities_to_file(entities, filename):
     with open(filename, 'w') as f:
         json.dump(entities, f)
 
 
-def create_embedding(input, model):
-    _LOGGER.debug("Creating embedding")
-    return openai.Embedding.create(input=input, engine=model)['data'][0]['embedding']
-
-def post_request(url, headers, json_payload):
-    _LOGGER.debug("Sending POST request")
-    response = requests.post(url, headers=headers, json=json_payload)
-    return response.json()
-
-
-def get_request_pinecone(url, headers):
-    _LOGGER.debug("Sending GET request")
-    response = requests.get(url, headers=headers)
-    return response.json()
-
+def chunked(items, size):
+    """Yield successive slices of at most size items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def create_session(conf):
+    """Create the pooled HTTP session shared by all outbound calls."""
+    connector = aiohttp.TCPConnector(
+        limit=conf.get('max_connections', DEFAULT_MAX_CONNECTIONS),
+        limit_per_host=conf.get('max_connections_per_host', DEFAULT_MAX_CONNECTIONS_PER_HOST),
+        keepalive_timeout=conf.get('keepalive_timeout', DEFAULT_KEEPALIVE_TIMEOUT),
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=conf.get('request_timeout', DEFAULT_REQUEST_TIMEOUT),
+        connect=conf.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def async_request_json(session, method, url, headers=None, json_payload=None):
+    """Send a request and return the parsed JSON body (None when empty)."""
+    _LOGGER.debug(f"Sending {method} request to URL: {url}")
+    async with session.request(method, url, headers=headers, json=json_payload) as response:
+        text = await response.text()
+        if response.status >= 400:
+            _LOGGER.debug(f"Request failed with status {response.status}: {text}")
+        response.raise_for_status()
+    if not text:  # only attempt to parse if there's a response
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
 
 
-def get_request_pinecone_host(url, headers):
-    _LOGGER.debug("Sending GET request")
-    response = requests.get(url, headers=headers)
-    parsed_response = response.json()
+async def async_get_pinecone_host(session, url, headers):
+    parsed_response = await async_request_json(session, "GET", url, headers)
+    if not isinstance(parsed_response, dict):
+        _LOGGER.debug(f"Unexpected Pinecone controller response: {parsed_response}")
+        return {}, None
     return parsed_response, parsed_response.get('status', {}).get('host')
 
 
-
-
-def post_request_pinecone(url, headers, json_payload):
-    _LOGGER.debug(f"Sending POST request to URL: {url}")
-    _LOGGER.debug(f"POST data: {json.dumps(json_payload, indent=2)}")  # pretty print the JSON data
-    response = requests.post(url, headers=headers, json=json_payload)
-    if response.content:  # only attempt to parse if there's a response
-        return response.json()
-    else:
+async def async_probe_with_backoff(probe, timeout, initial_delay=PROBE_INITIAL_DELAY, max_delay=PROBE_MAX_DELAY):
+    """Await probe() until it returns something other than None, backing off exponentially.
+
+    Request errors count as not ready. Returns None if timeout seconds pass first.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            result = await probe()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.debug(f"Readiness probe failed: {err}")
+            result = None
+        if result is not None:
+            return result
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+class PineconeHostCache:
+    """Resolve the Pinecone index host once and reuse it until the TTL expires."""
+
+    def __init__(self, session, headers, ttl, controller_url):
+        """Initialize the cache."""
+        self._session = session
+        self._headers = headers
+        self._controller_url = controller_url
+        self._ttl = ttl
+        self._hosts = {}
+        self._lock = asyncio.Lock()
+
+    def set(self, environment, host):
+        """Store a host that is already known, e.g. after an index build."""
+        self._hosts[environment] = (host, time.monotonic() + self._ttl)
+
+    def invalidate(self, environment):
+        """Forget the host so the next lookup resolves it again."""
+        self._hosts.pop(environment, None)
+
+    def _get_cached(self, environment):
+        cached = self._hosts.get(environment)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
         return None
 
+    async def async_get(self, environment):
+        """Return the index host, resolving it through the controller if needed."""
+        host = self._get_cached(environment)
+        if host:
+            return host
+
+        # Serialize lookups so a burst of prompts resolves the host only once
+        async with self._lock:
+            host = self._get_cached(environment)
+            if host:
+                return host
+            _LOGGER.debug(f"Resolving Pinecone host for environment {environment}")
+            _, host = await async_get_pinecone_host(
+                self._session,
+                f'{self._controller_url.format(environment=environment)}/databases/{index_name}',
+                self._headers
+            )
+            if host:
+                self.set(environment, host)
+            return host
+
+
+class PineconeWriter:
+    """Write vectors to a Pinecone index host."""
+
+    def __init__(self, session, url, headers):
+        """Initialize the writer for the index at url."""
+        self._session = session
+        self._url = url
+        self._headers = headers
+
+    async def async_upsert(self, vectors):
+        """Upsert a batch of vectors."""
+        # Make the POST request to Pinecone service
+        response = await async_request_json(self._session, "POST", f"{self._url}/vectors/upsert", self._headers, {"vectors": vectors})
+        _LOGGER.debug(f"Upsert response: {response}")
+
+    async def async_delete(self, ids):
+        """Delete vectors by id."""
+        response = await async_request_json(self._session, "POST", f"{self._url}/vectors/delete", self._headers, {"ids": ids})
+        _LOGGER.debug(f"Delete response: {response}")
+
+    async def async_describe_index_stats(self):
+        """Return the index statistics; this only succeeds once the index accepts data requests."""
+        return await async_request_json(self._session, "POST", f"{self._url}/describe_index_stats", self._headers, {})
+
+    async def async_flush(self):
+        """Pinecone persists writes itself."""
+
+
+class LocalIndexWriter:
+    """Write vectors to the in-process index."""
+
+    def __init__(self, hass, index):
+        """Initialize the writer for a LocalIndex."""
+        self._hass = hass
+        self._index = index
+        # Batches are synced concurrently, but the index must only be changed from one thread at a time
+        self._lock = asyncio.Lock()
+
+    async def async_upsert(self, vectors):
+        """Upsert a batch of vectors."""
+        async with self._lock:
+            await self._hass.async_add_executor_job(self._index.upsert, vectors)
+
+    async def async_delete(self, ids):
+        """Delete vectors by id."""
+        async with self._lock:
+            await self._hass.async_add_executor_job(self._index.delete, ids)
+
+    async def async_flush(self):
+        """Persist the index to disk."""
+        async with self._lock:
+            await self._hass.async_add_executor_job(self._index.save)
 
 
 async def async_setup(hass: HomeAssistant, config: dict):
@@ -76,27 +297,525 @@ async def async_setup(hass: HomeAssistant, config: dict):
     _LOGGER.debug("Setting up OpenAssist")
 
     conf = config[DOMAIN] 
-    openai.api_key = conf['openai_key']
-    pinecone_env = conf['pinecone_env']
+    openai_key = conf['openai_key']
+    openai_api_base = conf.get('openai_api_base', OPENAI_API_BASE)
+    controller_url = conf.get('pinecone_controller_url', PINECONE_CONTROLLER_URL)
+    # Index hosts returned by the controller are reached with the controller's scheme
+    pinecone_scheme = controller_url.split("://", 1)[0]
+    docs_dir = hass.config.path(DOCS_DIR)
+    pinecone_env = conf.get('pinecone_env')
     headers = {
-        'Api-Key': conf['pinecone_key'],
+        'Api-Key': conf.get('pinecone_key', ''),
         'Accept': 'application/json',
         'Content-Type': 'application/json'
     }
 
-    # Get the included domains from the configuration, split by comma and strip whitespaces
-    included_domains = [domain.strip() for domain in conf['included_domains'].split(',')]
+    embedding_batch_size = conf.get('embedding_batch_size', DEFAULT_EMBEDDING_BATCH_SIZE)
+    upsert_batch_size = conf.get('upsert_batch_size', DEFAULT_UPSERT_BATCH_SIZE)
+    index_ready_timeout = conf.get('index_ready_timeout', DEFAULT_INDEX_READY_TIMEOUT)
+    checkpoint_interval = conf.get('checkpoint_interval', DEFAULT_CHECKPOINT_INTERVAL)
+    openai_max_concurrent = conf.get('openai_max_concurrent', DEFAULT_OPENAI_MAX_CONCURRENT)
+
+    # One pooled session for OpenAI and Pinecone so connections are kept alive between prompts
+    session = create_session(conf)
+    hass.data.setdefault(DOMAIN, {})["session"] = session
+    hass.data[DOMAIN]["openai"] = {"api_key": openai_key, "api_base": openai_api_base}
+    # Index builds share these so they run as fast as the API limits allow, retrying throttled calls
+    max_retries = conf.get('max_retries', DEFAULT_MAX_RETRIES)
+    openai_scheduler = RequestScheduler(
+        "OpenAI",
+        openai_max_concurrent,
+        conf.get('openai_rpm', DEFAULT_OPENAI_RPM),
+        conf.get('openai_tpm', DEFAULT_OPENAI_TPM),
+        max_retries,
+    )
+    pinecone_scheduler = RequestScheduler(
+        "Pinecone",
+        conf.get('pinecone_max_concurrent', DEFAULT_PINECONE_MAX_CONCURRENT),
+        conf.get('pinecone_rpm', DEFAULT_PINECONE_RPM),
+        0,
+        max_retries,
+    )
+    host_cache = PineconeHostCache(session, headers, conf.get('pinecone_host_ttl', DEFAULT_PINECONE_HOST_TTL), controller_url)
+
+    embedding_cache = EmbeddingCache(
+        conf.get('embedding_cache_size', DEFAULT_EMBEDDING_CACHE_SIZE),
+        conf.get('embedding_cache_ttl', DEFAULT_EMBEDDING_CACHE_TTL),
+        os.path.join(docs_dir, EMBEDDING_CACHE_FILE) if conf.get('embedding_cache_persist', False) else None,
+    )
+    await hass.async_add_executor_job(embedding_cache.load)
+    hass.data.setdefault(DOMAIN, {})["embedding_cache"] = embedding_cache
+    hass.data[DOMAIN]["latency"] = LatencyTracker(conf.get('latency_window', DEFAULT_LATENCY_WINDOW))
+
+    embedding_backend = conf.get('embedding_backend', EMBEDDING_BACKEND_OPENAI)
+    if embedding_backend == EMBEDDING_BACKEND_LOCAL:
+        if importlib.util.find_spec("sentence_transformers") is None:
+            _LOGGER.error("The local embedding backend needs the sentence-transformers package, please install it")
+            await session.close()
+            return False
+        embedder = LocalEmbeddings(
+            hass,
+            conf.get('embedding_model', DEFAULT_LOCAL_EMBEDDING_MODEL),
+            conf.get('local_embedding_batch_size', DEFAULT_LOCAL_BATCH_SIZE),
+            conf.get('embedding_device', 'cpu'),
+        )
+    else:
+        try:
+            embedder = OpenAIEmbeddings(
+                session,
+                openai_api_base,
+                openai_key,
+                conf.get('embedding_model', DEFAULT_OPENAI_EMBEDDING_MODEL),
+                openai_scheduler,
+                conf.get('embedding_dimension'),
+            )
+        except ValueError as err:
+            _LOGGER.error(str(err))
+            await session.close()
+            return False
+    # Prompts arriving together from several satellites share one embedding request
+    embedding_batcher = EmbeddingBatcher(
+        hass,
+        embedder,
+        conf.get('embedding_batch_window', DEFAULT_BATCH_WINDOW),
+        conf.get('embedding_max_batch_size', DEFAULT_MAX_BATCH_SIZE),
+        conf.get('latency_window', DEFAULT_LATENCY_WINDOW),
+    )
+    hass.data[DOMAIN]["embedding_batcher"] = embedding_batcher
+
+    response_cache = None
+    if conf.get('response_cache', False):
+        response_cache = ResponseCache(
+            conf.get('response_cache_size', DEFAULT_RESPONSE_CACHE_SIZE),
+            conf.get('response_cache_ttl', DEFAULT_RESPONSE_CACHE_TTL),
+            conf.get('response_cache_threshold', DEFAULT_RESPONSE_CACHE_THRESHOLD),
+        )
+        hass.data[DOMAIN]["response_cache"] = response_cache
+
+    local_index = None
+    if conf.get('retrieval_backend', RETRIEVAL_BACKEND_PINECONE) == RETRIEVAL_BACKEND_LOCAL:
+        # Imported lazily so numpy is only needed for the local backend
+        if importlib.util.find_spec("numpy") is None:
+            _LOGGER.error("The local retrieval backend needs the numpy package, please install it")
+            await session.close()
+            return False
+        from .local_index import LocalIndex
+
+        local_index = LocalIndex(os.path.join(docs_dir, LOCAL_INDEX_FILE), conf.get('local_index_dtype', 'float32'))
+        if not await hass.async_add_executor_job(local_index.load):
+            _LOGGER.warning("Local index is empty, set input_text.pinecone_index to build it")
+
+    manifest = IndexManifest(os.path.join(docs_dir, INDEX_MANIFEST_FILE))
+    await hass.async_add_executor_job(manifest.load)
+    if manifest.target and manifest.model is None:
+        manifest.model = LEGACY_EMBEDDING_KEY
+    if manifest.target and manifest.model != embedder.key:
+        _LOGGER.warning(
+            f"The index was built with {manifest.model} but the embedding backend is now {embedder.key}, "
+            "set input_text.pinecone_index to rebuild it"
+        )
+    sync_lock = asyncio.Lock()
 
-    # Open the file and load the entities
-    with open('/config/.storage/core.entity_registry', 'r') as f:
-        all_entities = json.load(f)["data"]["entities"]
+    # Get the included domains from the configuration, split by comma and strip whitespaces
+    included_domains = {domain.strip() for domain in conf['included_domains'].split(',')}
+
+    # Use the entity registry Home Assistant already has in memory, the storage file is only a fallback
+    try:
+        registry = er.async_get(hass)
+    except KeyError:
+        registry = None
+    if registry is not None:
+        entities = {
+            entry.entity_id: registry_entry_to_dict(entry)
+            for entry in registry.entities.values()
+            if entry.domain in included_domains
+        }
+    else:
+        all_entities = await hass.async_add_executor_job(load_registry_entities, hass.config.path(ENTITY_REGISTRY_PATH))
+        entities = filter_entities(all_entities, included_domains)
+    _LOGGER.debug(f"Loaded {len(entities)} entities in the included domains")
 
-    # Filter the entities
-    entities = filter_entities(all_entities, included_domains)
-    
     # Write filtered entities to new json file
-    write_filtered_entities_to_file(entities, '/config/custom_components/openassist/docs/filtered_entities.json')
+    await hass.async_add_executor_job(write_filtered_entities_to_file, dict(entities), os.path.join(docs_dir, FILTERED_ENTITIES_FILE))
+
+    fast_path = FastPathMatcher(entities) if conf.get('fast_path', True) else None
+    lexical_index = LexicalIndex(entities) if conf.get('hybrid_retrieval', True) else None
+
+    adaptive = conf.get('adaptive_top_k', True)
+    top_k = conf.get('top_k', DEFAULT_TOP_K)
+    min_top_k = conf.get('min_top_k', DEFAULT_MIN_TOP_K)
+    max_top_k = conf.get('max_top_k', DEFAULT_MAX_TOP_K)
+    decisive_margin = conf.get('decisive_margin', DEFAULT_DECISIVE_MARGIN)
+
+    document_fields = conf.get('document_fields')
+    document_builder = EntityDocumentBuilder(
+        hass,
+        [field.strip() for field in document_fields.split(',')] if document_fields else DOCUMENT_FIELDS,
+    )
+
+
+    async def async_sync_index(writer, changed_ids=None, removed_ids=None, report_progress=False):
+        """Embed and upsert entities whose text changed since the last sync, and delete removed ones.
+
+        With no changed_ids every filtered entity is checked and anything in the
+        manifest that is no longer filtered gets deleted.
+        """
+        if changed_ids is None:
+            candidates = list(entities.values())
+            removed_ids = [vector_id for vector_id in manifest.hashes if vector_id not in entities]
+        else:
+            candidates = [entities[entity_id] for entity_id in changed_ids if entity_id in entities]
+            removed_ids = [vector_id for vector_id in removed_ids or () if vector_id in manifest.hashes]
+
+        pending = []
+        for entity, text in zip(candidates, document_builder.build_all(candidates)):
+            text_hash = content_hash(text)
+            if manifest.hashes.get(entity["entity_id"]) != text_hash:
+                pending.append((entity, text, text_hash))
+        _LOGGER.debug(f"Index sync: {len(pending)} of {len(candidates)} entities changed, {len(removed_ids)} removed")
+        if report_progress and pending:
+            before, after = await hass.async_add_executor_job(
+                token_report, [entity for entity, _, _ in pending], [text for _, text, _ in pending]
+            )
+            _LOGGER.info(
+                f"Embedding {len(pending)} entity documents: {after} tokens instead of {before} "
+                f"for the full registry records ({100 - round(after * 100 / before) if before else 0}% fewer)"
+            )
+
+        index_status = "Uploading entity data. You will be notified once complete."
+        if report_progress:
+            hass.states.async_set("sensor.openassist_response", "Upserting data", {"index_status": index_status})
+        total = len(pending)
+        done = 0
+        failed = []
+        start = time.monotonic()
+        last_checkpoint = start
+        checkpoint_lock = asyncio.Lock()
+        # Bounds how many embedded batches are held in memory waiting to be upserted
+        batch_semaphore = asyncio.Semaphore(openai_max_concurrent)
+
+        async def async_sync_batch(batch):
+            """Embed and upsert one batch, recording entities that still fail after retries."""
+            nonlocal done, last_checkpoint
+            texts = [text for _, text, _ in batch]
+            async with batch_semaphore:
+                try:
+                    # Create the embeddings for the whole batch in one request
+                    embeds = await embedder.async_embed_documents(texts)
+                except (aiohttp.ClientError, asyncio.TimeoutError, EmbeddingError) as err:
+                    _LOGGER.error(f"Embedding {len(batch)} entities failed: {err}")
+                    failed.extend(entity["entity_id"] for entity, _, _ in batch)
+                    return
+
+                vectors = []
+                hashes = {}
+                for (entity, _, text_hash), embed in zip(batch, embeds):
+                    vectors.append({
+                        "id": entity["entity_id"],
+                        "values": list(embed),
+                        "namespace": "entities",
+                        "metadata": entity_metadata(entity)  # not serializing the metadata
+                    })
+                    hashes[entity["entity_id"]] = text_hash
+
+                for vector_batch in chunked(vectors, upsert_batch_size):
+                    try:
+                        await pinecone_scheduler.async_call(lambda vector_batch=vector_batch: writer.async_upsert(vector_batch))
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                        _LOGGER.error(f"Upserting {len(vector_batch)} entities failed: {err}")
+                        failed.extend(vector["id"] for vector in vector_batch)
+                        continue
+                    for vector in vector_batch:
+                        manifest.hashes[vector["id"]] = hashes[vector["id"]]
+
+                    done += len(vector_batch)
+                    elapsed = time.monotonic() - start
+                    if report_progress:
+                        hass.states.async_set("sensor.openassist_response", "Upserting data", {
+                            "index_status": index_status,
+                            "progress": f"{done}/{total}",
+                            "entities_per_second": round(done / elapsed, 1) if elapsed else None,
+                            "failed": len(failed),
+                        })
+
+            if time.monotonic() - last_checkpoint >= checkpoint_interval and not checkpoint_lock.locked():
+                async with checkpoint_lock:
+                    # Checkpoint the confirmed batches so an interrupted build resumes from here. The
+                    # hashes are taken before the flush: batches upserted after it are not on disk yet
+                    hashes = dict(manifest.hashes)
+                    await writer.async_flush()
+                    await hass.async_add_executor_job(manifest.save, hashes)
+                    last_checkpoint = time.monotonic()
+                    _LOGGER.debug(f"Index sync checkpoint saved after {done} of {total} entities")
+
+        try:
+            await asyncio.gather(*(async_sync_batch(batch) for batch in chunked(pending, embedding_batch_size)))
+
+            for id_batch in chunked(list(removed_ids), upsert_batch_size):
+                try:
+                    await pinecone_scheduler.async_call(lambda id_batch=id_batch: writer.async_delete(id_batch))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    # Still in the manifest, so the next full sync deletes them again
+                    _LOGGER.error(f"Deleting {len(id_batch)} entities failed: {err}")
+                    failed.extend(id_batch)
+                    continue
+                for vector_id in id_batch:
+                    manifest.hashes.pop(vector_id, None)
+        finally:
+            hashes = dict(manifest.hashes)
+            await writer.async_flush()
+            await hass.async_add_executor_job(manifest.save, hashes)
+        _LOGGER.debug(
+            f"Upserted {done} and deleted {len(removed_ids)} entities in {time.monotonic() - start:.1f}s "
+            f"({openai_scheduler.retries} OpenAI and {pinecone_scheduler.retries} Pinecone retries so far)"
+        )
+        if failed:
+            _LOGGER.error(f"{len(failed)} entities could not be synced and will be retried on the next sync: {', '.join(sorted(failed))}")
+        return failed
+
+    async def async_run_build(writer, description):
+        """Run a full sync under the build marker, so an interrupted build is resumed later."""
+        manifest.building = True
+        await hass.async_add_executor_job(manifest.save)
+        try:
+            failed = await async_sync_index(writer, report_progress=True)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.error(f"Building the {description} index failed, it will resume from the last checkpoint: {err}")
+            hass.states.async_set("sensor.openassist_response", "Build failed", {"index_status": f"Building the {description} index failed. It will resume where it stopped when Home Assistant restarts or the build is triggered again."})
+            return
+        if failed:
+            # Keep the marker so the failed entities are retried at the next startup
+            hass.states.async_set("sensor.openassist_response", "Ready", {
+                "index_status": f"Your {description} index is ready to use, but {len(failed)} entities could not be added. They will be retried on the next build.",
+                "failed_entities": sorted(failed)[:50],
+            })
+            return
+        manifest.building = False
+        await hass.async_add_executor_job(manifest.save)
+        hass.states.async_set("sensor.openassist_response", "Ready", {"index_status": f"Your {description} index is ready to use! Enjoy."})
+
+    async def async_build_local_index():
+        """Bring the local index up to date with the filtered entities."""
+        hass.states.async_set("sensor.openassist_response", "Building index", {"index_status": "Please wait while the local index gets built"})
+        async with sync_lock:
+            if manifest.target != RETRIEVAL_BACKEND_LOCAL or manifest.model != embedder.key or not len(local_index):
+                manifest.reset(RETRIEVAL_BACKEND_LOCAL, embedder.key)
+                local_index.clear()
+            await async_run_build(LocalIndexWriter(hass, local_index), "local")
+
+    async def async_get_index_writer():
+        """Return a writer for the index the manifest describes, or None if nothing was built yet."""
+        if manifest.model != embedder.key:
+            # Vectors from another model can't be mixed in, the index needs a full rebuild
+            return None
+        if local_index is not None:
+            return LocalIndexWriter(hass, local_index) if manifest.target == RETRIEVAL_BACKEND_LOCAL else None
+        if not manifest.target or not manifest.target.startswith(f"{RETRIEVAL_BACKEND_PINECONE}:"):
+            return None
+        environment = manifest.target.split(":", 1)[1]
+        host = await host_cache.async_get(environment)
+        if not host:
+            _LOGGER.error("Unable to fetch Pinecone host information.")
+            return None
+        return PineconeWriter(session, f"{pinecone_scheme}://{host}", headers)
+
+    pending_changed = set()
+    pending_removed = set()
+    cancel_pending_sync = None
+
+    @callback
+    def async_entity_registry_updated(event):
+        """Track entity registry changes and schedule an incremental sync."""
+        nonlocal cancel_pending_sync
+        action = event.data["action"]
+        entity_id = event.data["entity_id"]
+
+        old_entity_id = event.data.get("old_entity_id")
+        if old_entity_id and entities.pop(old_entity_id, None) is not None:
+            pending_removed.add(old_entity_id)
+            pending_changed.discard(old_entity_id)
+
+        entry = None
+        if action != "remove":
+            entry = er.async_get(hass).async_get(entity_id)
+        if entry is not None and entity_id.split(".", 1)[0] in included_domains:
+            entities[entity_id] = registry_entry_to_dict(entry)
+            pending_changed.add(entity_id)
+            pending_removed.discard(entity_id)
+        elif entities.pop(entity_id, None) is not None:
+            pending_removed.add(entity_id)
+            pending_changed.discard(entity_id)
+        else:
+            return
+
+        if cancel_pending_sync is not None:
+            cancel_pending_sync()
+        cancel_pending_sync = async_call_later(hass, REGISTRY_SYNC_DELAY, async_sync_registry_changes)
+
+    async def async_sync_registry_changes(_now):
+        """Sync the entities changed since the last registry event burst."""
+        nonlocal cancel_pending_sync
+        cancel_pending_sync = None
+        changed_ids = set(pending_changed)
+        removed_ids = set(pending_removed)
+        pending_changed.clear()
+        pending_removed.clear()
+
+        await hass.async_add_executor_job(write_filtered_entities_to_file, dict(entities), os.path.join(docs_dir, FILTERED_ENTITIES_FILE))
+        if fast_path is not None:
+            fast_path.rebuild(entities)
+        if lexical_index is not None:
+            lexical_index.rebuild(entities)
+
+        async with sync_lock:
+            writer = await async_get_index_writer()
+            if writer is None:
+                _LOGGER.debug("No index has been built yet, skipping incremental sync")
+                return
+            await async_sync_index(writer, changed_ids, removed_ids)
+
+    async def async_embed_prompt(prompt):
+        """Return the prompt embedding, served from the LRU cache when possible."""
+        xq = embedding_cache.get(prompt, embedder.key)
+        if xq is not None:
+            _LOGGER.debug("Using cached embedding for prompt")
+            return xq
+        start = time.monotonic()
+        xq = await embedding_batcher.async_embed(prompt)
+        embedding_cache.put(prompt, embedder.key, xq, time.monotonic() - start)
+        return xq
+
+    async def async_save_embedding_cache(event):
+        """Persist the embedding cache on shutdown."""
+        await hass.async_add_executor_job(embedding_cache.save)
+
+    async def async_query_pinecone(xq, timer, top_k):
+        """Query Pinecone through the cached host, re-resolving it once on connection errors."""
+        payload = {
+            "vector": list(xq),
+            "includeMetadata": True,
+            "topK": top_k
+        }
+        for _ in range(2):
+            with timer.stage("pinecone_host"):
+                pinecone_host = await host_cache.async_get(pinecone_env)
+            if not pinecone_host:
+                _LOGGER.error("Unable to fetch Pinecone host information.")
+                return None
+
+            _LOGGER.debug("Payload prepared, sending POST request to Pinecone")
+            try:
+                with timer.stage("pinecone_query"):
+                    response_json = await async_request_json(session, "POST", f"{pinecone_scheme}://{pinecone_host}/query", headers, payload)
+            except aiohttp.ClientConnectionError as err:
+                _LOGGER.warning(f"Pinecone query to {pinecone_host} failed: {err}")
+                host_cache.invalidate(pinecone_env)
+                continue
+            _LOGGER.debug("POST request to Pinecone complete, processing response")
+            return response_json
+
+        _LOGGER.error("Pinecone query failed after re-resolving the host.")
+        return None
 
+    async def async_prime_host_cache():
+        """Resolve the Pinecone host ahead of the first prompt."""
+        try:
+            await host_cache.async_get(pinecone_env)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.warning(f"Unable to resolve Pinecone host during setup: {err}")
+
+    async def async_process_prompt(job):
+        """Retrieve the entities for a prompt and hand it to the sensor, returning True once handed over."""
+        prompt = job.prompt
+        timer = PromptTimer(job.prompt_id, {"queue": job.queue_ms})
+
+        if fast_path is not None:
+            with timer.stage("fast_path"):
+                action = fast_path.match(prompt)
+            if action is not None:
+                _LOGGER.debug(f"Fast path matched prompt {timer.prompt_id}: {action}")
+                hass.bus.async_fire(EVENT_OPENASSIST_UPDATE, {
+                    "new_state": prompt,
+                    "matches": [],
+                    "prompt_id": timer.prompt_id,
+                    "timings": timer.timings,
+                    "response": json.dumps(action),
+                })
+                return True
+
+        # Fetch enough candidates for the largest K the prompt may get
+        query_k = max_top_k if adaptive else top_k
+        try:
+            _LOGGER.debug(f"Generating embeddings for prompt {timer.prompt_id}")
+            with timer.stage("embedding"):
+                xq = await async_embed_prompt(prompt)
+            if local_index is not None:
+                with timer.stage("local_query"):
+                    matches = local_index.query(xq, top_k=query_k)
+                _LOGGER.debug("Local index query complete, processing response")
+            else:
+                _LOGGER.debug("Embeddings generated, preparing payload for Pinecone")
+                response_json = await async_query_pinecone(xq, timer, query_k)
+                if response_json is None:
+                    return False
+                matches = response_json['matches']
+        except (aiohttp.ClientError, asyncio.TimeoutError, EmbeddingError) as err:
+            _LOGGER.error(f"Retrieving entities for prompt {timer.prompt_id} failed: {err or type(err).__name__}")
+            return False
+        except (KeyError, TypeError) as err:
+            _LOGGER.error(f"Unexpected response while retrieving entities for prompt {timer.prompt_id}: {err}")
+            return False
+
+        with timer.stage("rerank"):
+            lexical_matches = lexical_index.search(prompt, query_k) if lexical_index is not None else []
+            k = top_k
+            if adaptive:
+                k = adaptive_top_k(prompt, matches, lexical_matches, lexical_index, top_k, min_top_k, max_top_k, decisive_margin)
+            if lexical_index is not None:
+                matches = fuse_matches(
+                    matches,
+                    lexical_matches,
+                    lambda entity_id: entity_metadata(entities[entity_id]) if entity_id in entities else None,
+                    k,
+                )
+            else:
+                matches = matches[:k]
+        _LOGGER.debug(f"Handing {len(matches)} entities to the LLM for prompt {timer.prompt_id}: {[match['id'] for match in matches]}")
+
+        event_data = {
+            "new_state": prompt,
+            # The sensor serializes the metadata into the prompt, within its token budget
+            "matches": [
+                {"id": match["id"], "score": match.get("score"), "metadata": match.get("metadata")}
+                for match in matches
+            ],
+            "prompt_id": timer.prompt_id,
+            "timings": timer.timings,
+        }
+        if response_cache is not None:
+            entity_ids = [match['id'] for match in matches]
+            cached_response = response_cache.lookup(prompt, xq, entity_ids)
+            if cached_response is not None:
+                event_data["response"] = cached_response
+            else:
+                response_cache.remember(timer.prompt_id, prompt, xq, entity_ids)
+
+        _LOGGER.debug("Firing OpenAssist update event")
+        hass.bus.async_fire(EVENT_OPENASSIST_UPDATE, event_data)
+        _LOGGER.debug("OpenAssist update event fired")
+        return True
+
+    scheduler = PromptScheduler(
+        hass,
+        async_process_prompt,
+        conf.get('prompt_debounce', DEFAULT_PROMPT_DEBOUNCE),
+        conf.get('max_concurrent_prompts', DEFAULT_MAX_CONCURRENT_PROMPTS),
+        conf.get('prompt_queue_size', DEFAULT_PROMPT_QUEUE_SIZE),
+        conf.get('prompt_supersede_window', DEFAULT_PROMPT_SUPERSEDE_WINDOW),
+        conf.get('request_timeout', DEFAULT_REQUEST_TIMEOUT) * 2,
+        SIGNAL_PROMPT_CANCELLED,
+    )
+    hass.data[DOMAIN]["scheduler"] = scheduler
 
     async def state_change_handler(event):
         """Handle an OpenAssist state change."""
@@ -104,44 +823,98 @@ async def async_setup(hass: HomeAssistant, config: dict):
         if entity_id == "input_text.openassist_prompt":
             _LOGGER.debug("Handling state change event for openassist_prompt")
             new_state = event.data.get("new_state")
-            if new_state is not None:
-                _LOGGER.debug("Generating embeddings for new state")
-                xq = await hass.async_add_executor_job(create_embedding, new_state.state, MODEL)
-                _LOGGER.debug("Embeddings generated, preparing payload for Pinecone")
-
-                # Fetch Pinecone host information
-                response = await hass.async_add_executor_job(
-                    get_request_pinecone,
-                    f'https://controller.{pinecone_env}.pinecone.io/databases/entities',
-                    headers
-                )
-                pinecone_host = response.get('status', {}).get('host')
-                if not pinecone_host:
-                    _LOGGER.error("Unable to fetch Pinecone host information.")
-                    return
-
-                url = f"https://{pinecone_host}/query"
-
-                payload = {
-                    "vector": list(xq),
-                    "includeMetadata": True,
-                    "topK": 5
-                }
-                _LOGGER.debug("Payload prepared, sending POST request to Pinecone")
-                response_json = await hass.async_add_executor_job(post_request, url, headers, payload)
-                _LOGGER.debug("POST request to Pinecone complete, processing response")
-
-                # Get metadata for all matches, convert them to strings and join them into a single string
-                all_matches_metadata = ', '.join([json.dumps(match['metadata']) for match in response_json['matches']])
-                _LOGGER.debug(f"All matches metadata: {all_matches_metadata}")
-
-                _LOGGER.debug("Firing OpenAssist update event")
-                hass.bus.async_fire(EVENT_OPENASSIST_UPDATE, {"new_state": new_state.state, "metadata": all_matches_metadata})
-                _LOGGER.debug("OpenAssist update event fired")
-
-
-
-
+            if new_state is not None and new_state.state:
+                scheduler.async_submit(new_state.state)
+
+
+
+
+
+    async def async_build_pinecone_index(environment_str):
+        """Create the Pinecone index if needed, wait until it accepts data and sync the entities into it."""
+        response = await async_request_json(
+            session,
+            "GET",
+            f'{controller_url.format(environment=environment_str)}/databases',
+            headers
+        )
+
+        existing_indexes = response
+        target = f"{RETRIEVAL_BACKEND_PINECONE}:{environment_str}"
+        if manifest.target != target or manifest.model != embedder.key:
+            manifest.reset(target, embedder.key)
+        try:
+            # The index dimension comes from the model
+            await embedder.async_load()
+        except EmbeddingError as err:
+            _LOGGER.error(str(err))
+            hass.states.async_set("sensor.openassist_response", "Build failed", {"index_status": "The embedding model could not be loaded, see the Home Assistant log."})
+            return
+        hass.states.async_set("sensor.openassist_response", "Building index", {"index_status": "Please wait while the Pinecone index gets built"})
+
+        created = index_name not in existing_indexes
+        if created:
+            # Create Pinecone index if it doesn't exist
+            index_payload = {
+                "name": index_name,
+                "dimension": embedder.dimension,
+                "metric": "cosine",
+                "pods": 1,
+                "replicas": 1,
+                "pod_type": "p1.x1"
+            }
+            # A new index is empty, so everything has to be embedded
+            manifest.reset(target, embedder.key)
+            try:
+                await async_request_json(session, "POST", f'{controller_url.format(environment=environment_str)}/databases', headers, index_payload)
+                _LOGGER.debug(f"Index '{index_name}' has been created successfully.")
+            except aiohttp.ClientResponseError as err:
+                _LOGGER.error(f"Failed to create index. HTTP status code: {err.status}. Response: {err.message}")
+                return  # Stop if we couldn't create the index
+
+        async def async_probe_ready():
+            """Return the index host once the controller reports the index as ready."""
+            response, host = await async_get_pinecone_host(
+                session,
+                f'{controller_url.format(environment=environment_str)}/databases/{index_name}',
+                headers
+            )
+            if response.get('status', {}).get('state') == 'Ready' and host:
+                return response.get('database', {}).get('dimension'), host
+            _LOGGER.debug("Index is not ready yet")
+            return None
+
+        # Wait until the index is ready
+        ready = await async_probe_with_backoff(async_probe_ready, index_ready_timeout)
+        if ready is None:
+            _LOGGER.error(f"Index '{index_name}' was not ready after {index_ready_timeout} seconds")
+            hass.states.async_set("sensor.openassist_response", "Index not ready", {"index_status": "The Pinecone index did not become ready. Please try again later."})
+            return
+        dimension, host = ready
+        if dimension and dimension != embedder.dimension:
+            _LOGGER.error(f"Index '{index_name}' has {dimension} dimensions but {embedder.key} produces {embedder.dimension}")
+            hass.states.async_set("sensor.openassist_response", "Dimension mismatch", {"index_status": f"The Pinecone index '{index_name}' was created for a different embedding model. Delete it in the Pinecone console and build it again."})
+            return
+        _LOGGER.debug("Index is ready.")
+        host_cache.set(environment_str, host)
+
+        # Pinecone service url
+        writer = PineconeWriter(session, f"{pinecone_scheme}://{host}", headers)
+
+        if created:
+            hass.states.async_set("sensor.openassist_response", "Index Created", {"index_status": "The Pinecone Index has been created. Entity Data upload will begin as soon as it accepts data."})
+        # A freshly created index can report Ready before it accepts data requests, so probe it directly
+        stats = await async_probe_with_backoff(writer.async_describe_index_stats, index_ready_timeout)
+        if stats is None:
+            _LOGGER.error(f"Index '{index_name}' did not accept requests after {index_ready_timeout} seconds")
+            hass.states.async_set("sensor.openassist_response", "Index not ready", {"index_status": "The Pinecone index did not become ready. Please try again later."})
+            return
+        if manifest.hashes and not stats.get('totalVectorCount'):
+            _LOGGER.warning("The Pinecone index is empty but the manifest is not, re-embedding every entity")
+            manifest.reset(target, embedder.key)
+
+        async with sync_lock:
+            await async_run_build(writer, "Pinecone")
 
     async def state_change_handler_pinecone(event):
         """Handle an OpenAssist state change."""
@@ -150,108 +923,44 @@ async def async_setup(hass: HomeAssistant, config: dict):
 
         if entity_id == "input_text.pinecone_index":
             environment = event.data.get("new_state")
-            if environment is not None:
-                environment_str = environment.state
+            if environment is not None and environment.state:
+                if local_index is not None:
+                    await async_build_local_index()
+                    return
 
-                response = await hass.async_add_executor_job(
-                    get_request_pinecone,
-                    f'https://controller.{environment_str}.pinecone.io/databases',
-                    headers 
-                )
+                await async_build_pinecone_index(environment.state)
 
-                existing_indexes = response
-                hass.states.async_set("sensor.openassist_response", "Building index", {"index_status": "Please wait while the Pinecone index gets built"})
-                
-                if index_name not in existing_indexes:
-                    # Create Pinecone index if it doesn't exist
-                    index_payload = {
-                        "name": index_name,
-                        "dimension": 1536,
-                        "metric": "cosine",
-                        "pods": 1,
-                        "replicas": 1,
-                        "pod_type": "p1.x1"
-                    }
-                    try:
-                        response = await hass.async_add_executor_job(post_request_pinecone, f'https://controller.{environment_str}.pinecone.io/databases', headers, index_payload)
-                        if response and 'status_code' in response:
-                            if response['status_code'] == 201:  # HTTP Status Code for 'Created'
-                                _LOGGER.debug(f"Index '{index_name}' has been created successfully.")
-                            else:
-                                _LOGGER.debug(f"Failed to create index. HTTP status code: {response['status_code']}. Response: {response['text']}")
-                                exit()  # Exit if we couldn't create the index
-                    except JSONDecodeError as e:
-                        _LOGGER.error(f"Error decoding JSON response: {e}")
-
-                # Wait until the index is ready
-                while True:
-                    response, host = await hass.async_add_executor_job(
-                        get_request_pinecone_host,
-                        f'https://controller.{environment_str}.pinecone.io/databases/{index_name}',
-                        headers
-                    )
-                    status = response.get('status', {}).get('state')
-                    if status == 'Ready':
-                        _LOGGER.debug("Index is ready.")
-                        _LOGGER.debug("Waiting an additional 3 minutes before beginning upsert operations...")
-                        hass.states.async_set("sensor.openassist_response", "Index Created", {"index_status": "The Pinecone Index has been created. Entity Data upload will begin in 3 minutes."})
-                        await asyncio.sleep(60)
-                        hass.states.async_set("sensor.openassist_response", "2 Mins Until Upload", {"index_status": "2 minutes until data upload."})
-                        await asyncio.sleep(60)
-                        hass.states.async_set("sensor.openassist_response", "1 Mins Until Upload", {"index_status": "1 minutes until data upload."})
-                        await asyncio.sleep(30)
-                        hass.states.async_set("sensor.openassist_response", "30 Secs Until Upload", {"index_status": "30 seconds until data upload."})
-                        await asyncio.sleep(30)
-                        break
-
-                    else:
-                        _LOGGER.debug("Index is not ready yet, waiting for 5 seconds...")
-                        await asyncio.sleep(5)  # use asyncio.sleep instead of time.sleep
-
-                # Pinecone service url
-                url = f"https://{host}"
-
-
-
-                # Populate the index
-                hass.states.async_set("sensor.openassist_response", "Upserting data", {"index_status": "Uploading entity data. You will be notified once complete."})
-                for entity in entities.values():
-                    # Create a string representation of the entity
-                    entity_str = json.dumps(entity)
-                    # Create the embedding
-                    res = await hass.async_add_executor_job(create_embedding, entity_str, MODEL)
-                    _LOGGER.debug(f"res: {res}")
-                    embed = res
-
-                    # Create a new dictionary with only the fields we want
-                    metadata = {field: str(entity[field]) for field in ["entity_id", "original_name", "platform"] if field in entity}
-
-                    # Define the payload to post
-                    payload = {
-                        "vectors": [
-                            {
-                                "id": entity["entity_id"],
-                                "values": list(embed),
-                                "namespace": "entities",
-                                "metadata": metadata  # not serializing the metadata
-                            }
-                        ]
-                    }
-
-                    # Make the POST request to Pinecone service
-                    response = await hass.async_add_executor_job(post_request_pinecone, f"{url}/vectors/upsert", headers, payload)
-                    if response and 'status_code' in response:
-                        if response['status_code'] == 200:  # HTTP Status Code for 'OK'
-                            _LOGGER.debug(f"Upsert response: {response['text']}")
-                        else:
-                            _LOGGER.debug(f"Failed to upsert. HTTP status code: {response['status_code']}. Response: {response['text']}")
-
-                hass.states.async_set("sensor.openassist_response", "Ready", {"index_status": "Your Pinecone index is ready to use! Enjoy."})
+    async def async_resume_build(hass):
+        """Resume an index build that was interrupted, e.g. by a restart."""
+        if local_index is not None and manifest.target == RETRIEVAL_BACKEND_LOCAL:
+            _LOGGER.info(f"Resuming the interrupted local index build ({len(manifest.hashes)} entities already indexed)")
+            await async_build_local_index()
+        elif local_index is None and manifest.target and manifest.target.startswith(f"{RETRIEVAL_BACKEND_PINECONE}:"):
+            _LOGGER.info(f"Resuming the interrupted Pinecone index build ({len(manifest.hashes)} entities already indexed)")
+            await async_build_pinecone_index(manifest.target.split(":", 1)[1])
+
+    if manifest.building:
+        async_at_start(hass, async_resume_build)
 
+    if local_index is None and pinecone_env:
+        hass.async_create_task(async_prime_host_cache())
 
+    async def async_preload_embedder():
+        """Load the embedding model ahead of the first prompt."""
+        try:
+            await embedder.async_load()
+        except EmbeddingError as err:
+            _LOGGER.error(str(err))
 
+    hass.async_create_task(async_preload_embedder())
 
+    async def async_close_session(event):
+        """Close the pooled HTTP session."""
+        await session.close()
 
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_save_embedding_cache)
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, async_close_session)
     hass.bus.async_listen(EVENT_STATE_CHANGED, state_change_handler)
     hass.bus.async_listen(EVENT_STATE_CHANGED, state_change_handler_pinecone)
+    hass.bus.async_listen(EVENT_ENTITY_REGISTRY_UPDATED, async_entity_registry_updated)
     return True
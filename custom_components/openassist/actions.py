@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def action_entity_ids(action):
+    """Return the entity ids an action targets, as a list."""
+    data = action.get('data') or {}
+    entity_ids = data.get('entity_id', action.get('entity_id'))
+    if isinstance(entity_ids, str):
+        entity_ids = [entity_id.strip() for entity_id in entity_ids.split(',')]
+    return [entity_id for entity_id in entity_ids or [] if entity_id]
+
+
+def group_actions(actions):
+    """Merge actions calling the same service with the same data into one call per group.
+
+    An action is only merged into an earlier call if none of its entities are
+    already targeted by another call, so per-entity ordering is preserved.
+    """
+    calls = []
+    by_key = {}
+    targeted = set()
+    for index, action in enumerate(actions):
+        domain = action.get('domain')
+        service = action.get('service')
+        entity_ids = action_entity_ids(action)
+        if not all([domain, service, entity_ids]):
+            _LOGGER.error(f"Action missing required fields: {action}")
+            continue
+        data = {key: value for key, value in (action.get('data') or {}).items() if key != 'entity_id'}
+        key = (domain, service, json.dumps(data, sort_keys=True, default=str))
+
+        call = by_key.get(key)
+        if call is None or targeted.intersection(entity_ids):
+            call = {"domain": domain, "service": service, "data": data, "entity_ids": [], "actions": []}
+            calls.append(call)
+            by_key[key] = call
+        for entity_id in entity_ids:
+            if entity_id not in call["entity_ids"]:
+                call["entity_ids"].append(entity_id)
+        targeted.update(entity_ids)
+        call["actions"].append(index)
+    return calls
+
+
+class ActionExecutor:
+    """Run service calls as actions arrive, concurrently but in order per entity."""
+
+    def __init__(self, hass, concurrency, timeout, before=None):
+        """Initialize the executor; before is awaited once ahead of the first call."""
+        self._hass = hass
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._before = before
+        self._ready = None
+        self._actions = []
+        self._errors = []
+        self._tasks = []
+        self._last = {}
+
+    def submit(self, actions):
+        """Start the service calls for actions, merging those that can share a call."""
+        offset = len(self._actions)
+        self._actions.extend(actions)
+        self._errors.extend(["Action missing required fields"] * len(actions))
+        calls = group_actions(actions)
+        if len(calls) < len(actions):
+            _LOGGER.debug(f"Grouped {len(actions)} actions into {len(calls)} service calls")
+        if calls and self._before is not None and self._ready is None:
+            self._ready = asyncio.ensure_future(self._before())
+        for call in calls:
+            after = {self._last[entity_id] for entity_id in call["entity_ids"] if entity_id in self._last}
+            indexes = [offset + index for index in call["actions"]]
+            task = asyncio.ensure_future(self._async_call(call, indexes, after))
+            for entity_id in call["entity_ids"]:
+                self._last[entity_id] = task
+            self._tasks.append(task)
+
+    async def _async_call(self, call, indexes, after):
+        """Make one service call and return its task, or None if it was not made."""
+        data = dict(call["data"])
+        data['entity_id'] = call["entity_ids"] if len(call["entity_ids"]) > 1 else call["entity_ids"][0]
+        description = f"Service {call['domain']}.{call['service']} for {data['entity_id']}"
+        if after:
+            # An earlier call on the same entity may have timed out but still be running
+            earlier = await asyncio.gather(*after, return_exceptions=True)
+            running = [task for task in earlier if isinstance(task, asyncio.Task) and not task.done()]
+            if running:
+                _, still_running = await asyncio.wait(running, timeout=self._timeout)
+                if still_running:
+                    _LOGGER.error(f"{description} was not made, an earlier call for the same entity is still running")
+                    for index in indexes:
+                        self._errors[index] = "Not run, an earlier call for the same entity is still running"
+                    return None
+        if self._ready is not None:
+            await self._ready
+        error = None
+        async with self._semaphore:
+            # The call runs as its own task, so a timeout (or a superseding prompt)
+            # only stops waiting for it and never aborts a device command halfway
+            service_call = self._hass.async_create_task(
+                self._hass.services.async_call(call["domain"], call["service"], data, blocking=True)
+            )
+            try:
+                await asyncio.wait_for(asyncio.shield(service_call), self._timeout)
+            except asyncio.TimeoutError:
+                _LOGGER.error(f"{description} did not finish within {self._timeout}s, leaving it running")
+                error = f"Still running after {self._timeout}s"
+                service_call.add_done_callback(lambda task: self._log_late_result(description, task))
+            except Exception as err:  # pylint: disable=broad-except
+                _LOGGER.error(f"Service {call['domain']}.{call['service']} for {data['entity_id']} failed: {err}")
+                error = str(err) or type(err).__name__
+        for index in indexes:
+            self._errors[index] = error
+        return service_call
+
+    @staticmethod
+    def _log_late_result(description, task):
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            _LOGGER.error(f"{description} failed after timing out: {task.exception()}")
+        else:
+            _LOGGER.info(f"{description} finished after timing out")
+
+    def cancel(self):
+        """Stop waiting for calls that have not finished; calls already sent keep running."""
+        for task in self._tasks:
+            task.cancel()
+        if self._ready is not None:
+            self._ready.cancel()
+
+    async def async_results(self):
+        """Wait for every submitted call and return one result per action."""
+        await asyncio.gather(*self._tasks)
+        results = []
+        for action, error in zip(self._actions, self._errors):
+            result = {
+                "domain": action.get('domain'),
+                "service": action.get('service'),
+                "entity_id": action.get('entity_id'),
+                "success": error is None,
+            }
+            if error is not None:
+                result["error"] = error
+            results.append(result)
+        return results
+
+
+async def async_execute_actions(hass, actions, concurrency, timeout):
+    """Run the actions' service calls concurrently and return one result per action."""
+    executor = ActionExecutor(hass, concurrency, timeout)
+    executor.submit(actions)
+    return await executor.async_results()
@@ -0,0 +1,192 @@
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def normalize_prompt(text):
+    """Normalize prompt text so trivially different phrasings share a cache entry."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.strip(" .!?,")
+
+
+# Words that decide what an action does; prompts only share a response if these match exactly
+ACTION_WORDS = {
+    "on", "off", "open", "close", "closed", "lock", "unlock", "up", "down", "start", "stop", "pause",
+    "play", "resume", "enable", "disable", "arm", "disarm", "activate", "deactivate", "increase",
+    "decrease", "raise", "lower", "brighten", "dim", "brighter", "dimmer", "warmer", "cooler", "higher",
+    "mute", "unmute", "toggle", "not", "no", "don't", "dont",
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "twenty",
+    "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety", "hundred", "half", "quarter",
+}
+
+
+def action_signature(text):
+    """Return the numbers and action words of a prompt, in order."""
+    return tuple(
+        token for token in re.findall(r"\d+(?:\.\d+)?|[a-z']+", normalize_prompt(text))
+        if token in ACTION_WORDS or token[0].isdigit()
+    )
+
+
+class EmbeddingCache:
+    """Bounded LRU of prompt embeddings with a TTL and hit/miss counters."""
+
+    def __init__(self, max_size, ttl, path=None):
+        """Initialize the cache, optionally persisted to path."""
+        self._max_size = max_size
+        self._ttl = ttl
+        self._path = path
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._miss_seconds = 0.0
+
+    @staticmethod
+    def _key(text, model):
+        return f"{model}:{normalize_prompt(text)}"
+
+    def get(self, text, model):
+        """Return the cached embedding for text, or None."""
+        if not self._max_size:
+            return None
+        key = self._key(text, model)
+        entry = self._entries.get(key)
+        if entry is not None and (not self._ttl or time.time() - entry[1] < self._ttl):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, text, model, embedding, elapsed=None):
+        """Store an embedding; elapsed is the time the API call took."""
+        if elapsed is not None:
+            self._miss_seconds += elapsed
+        if not self._max_size:
+            return
+        key = self._key(text, model)
+        self._entries[key] = (list(embedding), time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    @property
+    def stats(self):
+        """Return counters suitable for entity attributes."""
+        lookups = self.hits + self.misses
+        average_miss = self._miss_seconds / self.misses if self.misses else 0
+        return {
+            "embedding_cache_size": len(self._entries),
+            "embedding_cache_hits": self.hits,
+            "embedding_cache_misses": self.misses,
+            "embedding_cache_hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "embedding_cache_time_saved": round(self.hits * average_miss, 2),
+        }
+
+    def load(self):
+        """Load persisted entries, dropping expired ones."""
+        if not self._path or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as err:
+            _LOGGER.warning(f"Unable to load embedding cache: {err}")
+            return
+        now = time.time()
+        for key, embedding, created in entries[-self._max_size:] if self._max_size else []:
+            if not self._ttl or now - created < self._ttl:
+                self._entries[key] = (embedding, created)
+        _LOGGER.debug(f"Loaded {len(self._entries)} cached embeddings")
+
+    def save(self):
+        """Persist the entries in LRU order."""
+        if not self._path:
+            return
+        entries = [[key, embedding, created] for key, (embedding, created) in self._entries.items()]
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self._path)
+
+
+def _normalize_vector(vector):
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else list(vector)
+
+
+class ResponseCache:
+    """Reuse LLM responses for near-duplicate prompts that retrieved the same entities."""
+
+    def __init__(self, max_size, ttl, threshold):
+        """Initialize the cache."""
+        self._max_size = max_size
+        self._ttl = ttl
+        self._threshold = threshold
+        self._entries = OrderedDict()
+        self._pending = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, prompt, embedding, entity_ids):
+        """Return a cached response for a similar prompt with the same entities and action words, or None."""
+        now = time.time()
+        entity_set = frozenset(entity_ids)
+        # "turn on" and "turn off" embed almost identically, so the similarity alone can't tell them apart
+        signature = action_signature(prompt)
+        vector = _normalize_vector(embedding)
+        best_key, best_similarity = None, -1.0
+        for key, (cached_vector, cached_entities, cached_signature, _, created) in list(self._entries.items()):
+            if self._ttl and now - created >= self._ttl:
+                del self._entries[key]
+                continue
+            if cached_entities != entity_set or cached_signature != signature:
+                continue
+            similarity = sum(a * b for a, b in zip(vector, cached_vector))
+            if similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+
+        if best_key is not None and best_similarity >= self._threshold:
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            _LOGGER.info(f"Response cache hit for '{prompt}': reusing the response to '{best_key}' (similarity {best_similarity:.4f})")
+            return self._entries[best_key][3]
+
+        self.misses += 1
+        if best_key is not None:
+            _LOGGER.debug(f"Response cache miss for '{prompt}': closest was '{best_key}' (similarity {best_similarity:.4f})")
+        return None
+
+    def remember(self, prompt_id, prompt, embedding, entity_ids):
+        """Hold a prompt's key until its response arrives."""
+        self._pending[prompt_id] = (normalize_prompt(prompt), _normalize_vector(embedding), frozenset(entity_ids), action_signature(prompt))
+        while len(self._pending) > self._max_size:
+            self._pending.popitem(last=False)
+
+    def store(self, prompt_id, response):
+        """Cache the response for a remembered prompt."""
+        pending = self._pending.pop(prompt_id, None)
+        if pending is None or not self._max_size:
+            return
+        key, vector, entity_set, signature = pending
+        self._entries[key] = (vector, entity_set, signature, response, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    @property
+    def stats(self):
+        """Return counters suitable for entity attributes."""
+        return {
+            "response_cache_size": len(self._entries),
+            "response_cache_hits": self.hits,
+            "response_cache_misses": self.misses,
+        }
@@ -0,0 +1,100 @@
+import json
+import logging
+
+import homeassistant.helpers.area_registry as ar
+import homeassistant.helpers.device_registry as dr
+
+from .ratelimit import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_LOGGER = logging.getLogger(__name__)
+
+DOCUMENT_FIELDS = ("name", "entity_id", "domain", "area", "device", "aliases", "platform")
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Count the tokens of text with tiktoken when it is installed, else estimate them."""
+    global _encoding
+    if tiktoken is None:
+        return estimate_tokens(text)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text))
+
+
+class EntityDocumentBuilder:
+    """Build the compact text that gets embedded for an entity.
+
+    Only the configured fields are included, in a fixed order, as
+    "field: value" pairs; empty values are left out.
+    """
+
+    def __init__(self, hass, fields=DOCUMENT_FIELDS):
+        """Initialize the builder for the given fields."""
+        unknown = [field for field in fields if field not in DOCUMENT_FIELDS]
+        if unknown:
+            _LOGGER.warning(f"Ignoring unknown document fields: {', '.join(unknown)}")
+        self._hass = hass
+        self.fields = [field for field in fields if field in DOCUMENT_FIELDS]
+
+    def _registries(self):
+        """Return the area and device registries, or None for any that is not loaded."""
+        registries = []
+        for registry in (ar, dr):
+            try:
+                registries.append(registry.async_get(self._hass))
+            except KeyError:
+                registries.append(None)
+        return registries
+
+    def values(self, entity, area_registry=None, device_registry=None):
+        """Return the document fields of an entity, without empty ones."""
+        entity_id = entity["entity_id"]
+        device = None
+        if entity.get("device_id") and device_registry is not None:
+            device = device_registry.async_get(entity["device_id"])
+
+        values = {}
+        for field in self.fields:
+            if field == "name":
+                value = entity.get("name") or entity.get("original_name") or entity_id.split(".", 1)[1].replace("_", " ")
+            elif field == "entity_id":
+                value = entity_id
+            elif field == "domain":
+                value = entity_id.split(".", 1)[0]
+            elif field == "area":
+                area_id = entity.get("area_id") or (device.area_id if device is not None else None)
+                area = area_registry.async_get_area(area_id) if area_id and area_registry is not None else None
+                value = area.name if area is not None else area_id
+            elif field == "device":
+                value = (device.name_by_user or device.name) if device is not None else None
+            elif field == "aliases":
+                value = ", ".join(sorted(alias for alias in entity.get("aliases") or () if alias))
+            else:
+                value = entity.get(field)
+            if value:
+                values[field] = str(value)
+        return values
+
+    def build(self, entity, area_registry=None, device_registry=None):
+        """Return the text that gets embedded for an entity."""
+        values = self.values(entity, area_registry, device_registry)
+        return "; ".join(f"{field}: {value}" for field, value in values.items())
+
+    def build_all(self, entities):
+        """Return the text for each entity, looking the registries up once."""
+        area_registry, device_registry = self._registries()
+        return [self.build(entity, area_registry, device_registry) for entity in entities]
+
+
+def token_report(entities, texts):
+    """Compare the tokens of the full registry records with the compact documents."""
+    before = sum(count_tokens(json.dumps(entity)) for entity in entities)
+    after = sum(count_tokens(text) for text in texts)
+    return before, after
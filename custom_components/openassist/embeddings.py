@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from .metrics import percentile
+from .ratelimit import estimate_tokens
+
+_LOGGER = logging.getLogger(__name__)
+
+EMBEDDING_BACKEND_OPENAI = "openai"
+EMBEDDING_BACKEND_LOCAL = "local"
+
+DEFAULT_OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+DEFAULT_LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_LOCAL_BATCH_SIZE = 32
+DEFAULT_BATCH_WINDOW = 5  # ms
+DEFAULT_MAX_BATCH_SIZE = 16
+
+# Dimensions of the OpenAI embedding models, anything else needs embedding_dimension
+OPENAI_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class EmbeddingError(Exception):
+    """The embedding model could not be loaded."""
+
+
+async def async_create_embeddings(session, api_base, api_key, inputs, model):
+    """Embed a list of inputs with a single request, preserving input order."""
+    _LOGGER.debug(f"Creating {len(inputs)} embeddings")
+    async with session.post(
+        f"{api_base}/embeddings",
+        headers={"Authorization": f"Bearer {api_key}"},
+        json={"input": inputs, "model": model},
+    ) as response:
+        if response.status >= 400:
+            _LOGGER.debug(f"Embedding request failed with status {response.status}: {await response.text()}")
+        response.raise_for_status()
+        data = (await response.json())['data']
+    return [item['embedding'] for item in sorted(data, key=lambda item: item['index'])]
+
+
+class OpenAIEmbeddings:
+    """Embed text with the OpenAI embeddings API."""
+
+    def __init__(self, session, api_base, api_key, model, scheduler, dimension=None):
+        """Initialize the backend; document batches go through the scheduler's rate limits."""
+        self._session = session
+        self._api_base = api_base
+        self._api_key = api_key
+        self._scheduler = scheduler
+        self.model = model
+        self.key = f"{EMBEDDING_BACKEND_OPENAI}:{model}"
+        self.dimension = dimension or OPENAI_DIMENSIONS.get(model)
+        if self.dimension is None:
+            raise ValueError(f"Unknown dimension for embedding model {model}, set embedding_dimension")
+
+    async def async_load(self):
+        """Nothing to load for a remote model."""
+
+    async def async_embed_query(self, text):
+        """Return the embedding of a prompt."""
+        return (await self.async_embed_queries([text]))[0]
+
+    async def async_embed_queries(self, texts):
+        """Return the embeddings of several prompts with one request."""
+        return await async_create_embeddings(self._session, self._api_base, self._api_key, texts, self.model)
+
+    async def async_embed_documents(self, texts):
+        """Return the embeddings of a batch of entity documents, waiting for API capacity."""
+        return await self._scheduler.async_call(
+            lambda: async_create_embeddings(self._session, self._api_base, self._api_key, texts, self.model),
+            tokens=sum(estimate_tokens(text) for text in texts),
+        )
+
+
+class LocalEmbeddings:
+    """Embed text with a sentence-transformers model on the CPU.
+
+    sentence-transformers is imported when the model is loaded, so it is only
+    needed when this backend is configured.
+    """
+
+    def __init__(self, hass, model, batch_size=DEFAULT_LOCAL_BATCH_SIZE, device="cpu"):
+        """Initialize the backend; the model is loaded on first use or by async_load."""
+        self._hass = hass
+        self._batch_size = batch_size
+        self._device = device
+        self._model = None
+        self._load_lock = asyncio.Lock()
+        # Document batches run one at a time, the model already uses every core for each
+        self._encode_lock = asyncio.Lock()
+        self.model = model
+        self.key = f"{EMBEDDING_BACKEND_LOCAL}:{model}"
+        self.dimension = None
+
+    def _load(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as err:
+            raise EmbeddingError("The local embedding backend needs the sentence-transformers package") from err
+        try:
+            model = SentenceTransformer(self.model, device=self._device)
+        except OSError as err:
+            raise EmbeddingError(f"Unable to load embedding model {self.model}: {err}") from err
+        return model, model.get_sentence_embedding_dimension()
+
+    async def async_load(self):
+        """Load the model in the executor, once."""
+        async with self._load_lock:
+            if self._model is not None:
+                return
+            start = self._hass.loop.time()
+            self._model, self.dimension = await self._hass.async_add_executor_job(self._load)
+            _LOGGER.info(f"Loaded embedding model {self.model} ({self.dimension} dimensions) in {self._hass.loop.time() - start:.1f}s")
+
+    def _encode(self, texts):
+        embeddings = self._model.encode(
+            texts,
+            batch_size=self._batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return embeddings.tolist()
+
+    async def async_embed_query(self, text):
+        """Return the embedding of a prompt."""
+        return (await self.async_embed_queries([text]))[0]
+
+    async def async_embed_queries(self, texts):
+        """Return the embeddings of several prompts in one forward pass."""
+        await self.async_load()
+        # Not behind the encode lock, so a prompt never waits for an index build batch
+        return await self._hass.async_add_executor_job(self._encode, texts)
+
+    async def async_embed_documents(self, texts):
+        """Return the embeddings of a batch of entity documents."""
+        await self.async_load()
+        async with self._encode_lock:
+            return await self._hass.async_add_executor_job(self._encode, texts)
+
+
+class EmbeddingBatcher:
+    """Combine prompt embeddings requested within a short window into one backend call.
+
+    Prompts from several satellites often arrive within milliseconds of each
+    other. The first one opens a window of window ms; everything queued until
+    it closes, or until max_batch_size prompts are waiting, is embedded
+    together and each caller gets its own vector back.
+    """
+
+    def __init__(self, hass, embedder, window, max_batch_size, stats_window=200):
+        """Initialize the batcher; window is in ms, 0 sends every prompt on its own."""
+        self._hass = hass
+        self._embedder = embedder
+        self._window = window / 1000
+        self._max_batch_size = max(1, max_batch_size)
+        self._pending = []
+        self._timer = None
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._delays = deque(maxlen=stats_window)
+        self.batches = 0
+
+    async def async_embed(self, text):
+        """Return the embedding of a prompt, batched with any others in the window."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.monotonic()))
+        if not self._window or len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._hass.async_create_task(self._async_embed_batch(batch))
+
+    async def _async_embed_batch(self, batch):
+        """Embed a batch and hand each waiting caller its result, or the error."""
+        now = time.monotonic()
+        for _, _, queued in batch:
+            self._delays.append(round((now - queued) * 1000, 1))
+        self._batch_sizes.append(len(batch))
+        self.batches += 1
+
+        # The same prompt sent from two rooms only needs embedding once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            embeddings = dict(zip(texts, await self._embedder.async_embed_queries(texts)))
+        except Exception as err:  # raised to every waiting caller instead
+            for _, future, _ in batch:
+                # A caller may have been cancelled, e.g. by a newer prompt
+                if not future.done():
+                    future.set_exception(err)
+            return
+        if len(batch) > 1:
+            _LOGGER.debug(f"Embedded {len(batch)} prompts in one request")
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(embeddings[text])
+
+    @property
+    def stats(self):
+        """Return batch size and queueing delay figures suitable for entity attributes."""
+        if not self.batches:
+            return {"embedding_batches": 0}
+        return {
+            "embedding_batches": self.batches,
+            "embedding_batch_size_avg": round(sum(self._batch_sizes) / len(self._batch_sizes), 2),
+            "embedding_batch_size_max": max(self._batch_sizes),
+            "embedding_queue_delay_p50": percentile(self._delays, 0.5),
+            "embedding_queue_delay_p95": percentile(self._delays, 0.95),
+        }
@@ -0,0 +1,198 @@
+import logging
+import re
+
+_LOGGER = logging.getLogger(__name__)
+
+# Service per spoken action and entity domain
+ACTION_SERVICES = {
+    "on": {
+        "light": "turn_on",
+        "switch": "turn_on",
+        "fan": "turn_on",
+        "input_boolean": "turn_on",
+        "media_player": "turn_on",
+        "climate": "turn_on",
+    },
+    "off": {
+        "light": "turn_off",
+        "switch": "turn_off",
+        "fan": "turn_off",
+        "input_boolean": "turn_off",
+        "media_player": "turn_off",
+        "climate": "turn_off",
+    },
+    "toggle": {
+        "light": "toggle",
+        "switch": "toggle",
+        "fan": "toggle",
+        "input_boolean": "toggle",
+        "cover": "toggle",
+    },
+    "open": {"cover": "open_cover"},
+    "close": {"cover": "close_cover"},
+    "lock": {"lock": "lock"},
+    "unlock": {"lock": "unlock"},
+}
+
+# Service and data key for "set X to N%"
+PERCENT_SERVICES = {
+    "light": ("turn_on", "brightness_pct"),
+    "fan": ("set_percentage", "percentage"),
+    "cover": ("set_cover_position", "position"),
+}
+
+# Words people append to a name that only say which kind of device they mean
+DOMAIN_WORDS = {
+    "light": "light",
+    "lights": "light",
+    "lamp": "light",
+    "lamps": "light",
+    "switch": "switch",
+    "switches": "switch",
+    "plug": "switch",
+    "plugs": "switch",
+    "socket": "switch",
+    "sockets": "switch",
+    "fan": "fan",
+    "fans": "fan",
+    "blind": "cover",
+    "blinds": "cover",
+    "curtain": "cover",
+    "curtains": "cover",
+    "shutter": "cover",
+    "shutters": "cover",
+    "lock": "lock",
+    "locks": "lock",
+}
+
+COMMAND_PATTERNS = (
+    re.compile(r"^(?:turn|switch) (?P<action>on|off) (?P<name>.+)$"),
+    re.compile(r"^(?:turn|switch) (?P<name>.+) (?P<action>on|off)$"),
+    re.compile(r"^(?P<action>toggle|open|close|lock|unlock) (?P<name>.+)$"),
+    re.compile(r"^set (?P<name>.+) to (?P<value>\d{1,3}) ?(?:%|percent)$"),
+)
+
+
+def normalize_command(text):
+    """Lower-case, drop punctuation and filler words around a command."""
+    text = re.sub(r"[^\w%\s]", " ", text.lower())
+    text = re.sub(r"\s+", " ", text).strip()
+    text = re.sub(r"^(?:please |can you |could you )+", "", text)
+    return re.sub(r" please$", "", text)
+
+
+def normalize_name(name):
+    """Normalize an entity name or spoken name for lookup."""
+    name = normalize_command(name.replace("_", " "))
+    return re.sub(r"^(?:the|my) ", "", name)
+
+
+class FastPathMatcher:
+    """Match simple device commands locally, without embeddings or the LLM."""
+
+    def __init__(self, entities):
+        """Build the name index from the filtered entities."""
+        self._names = {}
+        self._friendly_names = {}
+        self.rebuild(entities)
+
+    def rebuild(self, entities):
+        """Rebuild the name index, e.g. after entity registry changes."""
+        names = {}
+        friendly_names = {}
+        for entity_id, entity in entities.items():
+            object_id = entity_id.split(".", 1)[1]
+            friendly_names[entity_id] = entity.get("name") or entity.get("original_name") or object_id.replace("_", " ")
+            for name in (entity.get("name"), entity.get("original_name"), object_id):
+                if name:
+                    names.setdefault(normalize_name(name), set()).add(entity_id)
+        self._names = names
+        self._friendly_names = friendly_names
+        _LOGGER.debug(f"Fast path name index built with {len(names)} names")
+
+    def _named_like(self, stem, domains):
+        """Return the entities in domains called stem or something starting with it."""
+        prefix = f"{stem} "
+        return {
+            entity_id
+            for name, entity_ids in self._names.items() if name == stem or name.startswith(prefix)
+            for entity_id in entity_ids if entity_id.split(".", 1)[0] in domains
+        }
+
+    def _resolve(self, name, domains):
+        """Return the single entity called name in one of domains, or None."""
+        candidates = set(self._names.get(name, ()))
+        words = name.split(" ")
+        if len(words) > 1 and words[-1] in DOMAIN_WORDS and words[-1].endswith("s"):
+            # "kitchen lights" with lights named Kitchen, Kitchen Spots and Kitchen Ceiling means all of them
+            if len(self._named_like(" ".join(words[:-1]), {DOMAIN_WORDS[words[-1]]})) > 1:
+                return None
+        if not candidates and len(words) > 1 and words[-1] in DOMAIN_WORDS:
+            # "loft lights" -> an entity named "Loft" in the light domain
+            wanted = DOMAIN_WORDS[words[-1]]
+            candidates = {
+                entity_id for entity_id in self._names.get(" ".join(words[:-1]), ())
+                if entity_id.split(".", 1)[0] == wanted
+            }
+        if not candidates and name.endswith("s"):
+            # "kitchen spots" -> "Kitchen Spot", unless several devices are named like that
+            if len(self._named_like(name[:-1], domains)) > 1:
+                return None
+            candidates = set(self._names.get(name[:-1], ()))
+
+        candidates = {entity_id for entity_id in candidates if entity_id.split(".", 1)[0] in domains}
+        if len(candidates) > 1 and words[-1] in DOMAIN_WORDS:
+            # "kitchen light" when both light.kitchen_light and switch.kitchen_light exist
+            wanted = DOMAIN_WORDS[words[-1]]
+            candidates = {entity_id for entity_id in candidates if entity_id.split(".", 1)[0] == wanted}
+        if len(candidates) != 1:
+            return None
+        return candidates.pop()
+
+    def match(self, text):
+        """Return an action dict for an unambiguous simple command, or None."""
+        command = normalize_command(text)
+        for pattern in COMMAND_PATTERNS:
+            found = pattern.match(command)
+            if found is None:
+                continue
+            name = normalize_name(found.group("name"))
+            groups = found.groupdict()
+
+            if groups.get("value") is not None:
+                value = int(groups["value"])
+                if value > 100:
+                    return None
+                entity_id = self._resolve(name, PERCENT_SERVICES)
+                if entity_id is None:
+                    return None
+                domain = entity_id.split(".", 1)[0]
+                service, key = PERCENT_SERVICES[domain]
+                return {
+                    "domain": domain,
+                    "service": service,
+                    "entity_id": entity_id,
+                    "data": {key: value},
+                    "message": f"Setting the {self._friendly_names[entity_id]} to {value}%.",
+                }
+
+            services = ACTION_SERVICES[groups["action"]]
+            entity_id = self._resolve(name, services)
+            if entity_id is None:
+                return None
+            domain = entity_id.split(".", 1)[0]
+            return {
+                "domain": domain,
+                "service": services[domain],
+                "entity_id": entity_id,
+                "data": {},
+                "message": self._message(groups["action"], entity_id),
+            }
+        return None
+
+    def _message(self, action, entity_id):
+        friendly_name = self._friendly_names[entity_id]
+        if action in ("on", "off"):
+            return f"Turning {action} the {friendly_name}."
+        verbs = {"toggle": "Toggling", "open": "Opening", "close": "Closing", "lock": "Locking", "unlock": "Unlocking"}
+        return f"{verbs[action]} the {friendly_name}."
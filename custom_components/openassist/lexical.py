@@ -0,0 +1,146 @@
+import logging
+import math
+import re
+
+_LOGGER = logging.getLogger(__name__)
+
+# Words that ask for more than one device
+QUANTIFIERS = {"all", "every", "everything", "both", "each"}
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "can", "could", "do", "for", "in", "is", "it", "me", "my", "of", "off", "on",
+    "please", "set", "the", "to", "turn", "what", "whats", "you",
+}
+
+# Minimum trigram similarity for a prompt word to count as a (misspelt) name word
+MIN_SIMILARITY = 0.5
+
+
+def words(text):
+    """Split text into lower-case words, treating "_" and "." as separators."""
+    return re.findall(r"[a-z0-9]+", text.lower().replace("_", " "))
+
+
+def singular(word):
+    """Strip a plural ending from a word."""
+    if len(word) > 4 and word.endswith("es") and word[-3] in "sxz":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def trigrams(word):
+    """Return the character trigrams of a padded word."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LexicalIndex:
+    """Token and trigram index over entity names and ids for exact-name matching."""
+
+    def __init__(self, entities):
+        """Build the index from the filtered entities."""
+        self._postings = {}
+        self._trigrams = {}
+        self._idf = {}
+        self.rebuild(entities)
+
+    def rebuild(self, entities):
+        """Rebuild the index, e.g. after entity registry changes."""
+        postings = {}
+        for entity_id, entity in entities.items():
+            text = " ".join(filter(None, (entity.get("name"), entity.get("original_name"), entity_id)))
+            for token in {singular(word) for word in words(text)}:
+                postings.setdefault(token, set()).add(entity_id)
+
+        index_trigrams = {}
+        for token in postings:
+            for trigram in trigrams(token):
+                index_trigrams.setdefault(trigram, set()).add(token)
+
+        count = max(len(entities), 1)
+        self._idf = {token: math.log(1 + count / len(ids)) for token, ids in postings.items()}
+        self._postings = postings
+        self._trigrams = index_trigrams
+        _LOGGER.debug(f"Lexical index built with {len(postings)} tokens")
+
+    def _similar_tokens(self, word):
+        """Return the indexed tokens close to word, with their trigram similarity."""
+        if word in self._postings:
+            return {word: 1.0}
+        word_trigrams = trigrams(word)
+        shared = {}
+        for trigram in word_trigrams:
+            for token in self._trigrams.get(trigram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        similar = {}
+        for token, count in shared.items():
+            similarity = count / (len(word_trigrams) + len(trigrams(token)) - count)
+            if similarity >= MIN_SIMILARITY:
+                similar[token] = similarity
+        return similar
+
+    def search(self, text, limit):
+        """Return up to limit (entity_id, score) pairs, best first."""
+        scores = {}
+        for word in {singular(word) for word in words(text)} - STOP_WORDS:
+            best = {}
+            for token, similarity in self._similar_tokens(word).items():
+                weight = self._idf[token] * similarity
+                for entity_id in self._postings[token]:
+                    if weight > best.get(entity_id, 0):
+                        best[entity_id] = weight
+            for entity_id, weight in best.items():
+                scores[entity_id] = scores.get(entity_id, 0) + weight
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def wants_many(self, text):
+        """Return True if the prompt asks about several devices, e.g. "all" or "the kitchen lights"."""
+        for word in words(text):
+            if word in QUANTIFIERS:
+                return True
+            if singular(word) != word and singular(word) in self._postings and len(self._postings[singular(word)]) > 1:
+                return True
+        return False
+
+
+def adaptive_top_k(prompt, vector_matches, lexical_matches, lexical_index, top_k, min_top_k, max_top_k, margin):
+    """Pick how many entities to hand to the LLM for this prompt.
+
+    Prompts about several devices get max_top_k. When the best vector match
+    beats the runner-up by margin and the lexical index agrees, min_top_k is
+    enough. Otherwise top_k.
+    """
+    if lexical_index is not None and lexical_index.wants_many(prompt):
+        return max_top_k
+    if len(vector_matches) > 1 and vector_matches[0]["score"] - vector_matches[1]["score"] >= margin:
+        if not lexical_matches or lexical_matches[0][0] == vector_matches[0]["id"]:
+            return min_top_k
+    return top_k
+
+
+def fuse_matches(vector_matches, lexical_matches, metadata_for, limit, k=60):
+    """Merge vector and lexical rankings with reciprocal rank fusion.
+
+    Returns up to limit matches shaped like Pinecone matches; metadata_for(id)
+    supplies the metadata of entities only the lexical index found.
+    """
+    fused = {}
+    for rank, match in enumerate(vector_matches):
+        fused[match["id"]] = {
+            "id": match["id"],
+            "score": 1 / (k + rank + 1),
+            "vector_score": match.get("score"),
+            "metadata": match.get("metadata"),
+        }
+    for rank, (entity_id, lexical_score) in enumerate(lexical_matches):
+        match = fused.get(entity_id)
+        if match is None:
+            metadata = metadata_for(entity_id)
+            if metadata is None:
+                continue
+            match = fused[entity_id] = {"id": entity_id, "score": 0.0, "vector_score": None, "metadata": metadata}
+        match["score"] += 1 / (k + rank + 1)
+        match["lexical_score"] = round(lexical_score, 3)
+    return sorted(fused.values(), key=lambda match: match["score"], reverse=True)[:limit]
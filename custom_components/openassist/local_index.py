@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LocalIndex:
+    """In-process cosine similarity index over normalized entity embeddings."""
+
+    def __init__(self, path, dtype="float32"):
+        """Initialize the index, stored as <path>.npy and <path>.json."""
+        self._matrix_path = f"{path}.npy"
+        self._meta_path = f"{path}.json"
+        self._dtype = np.dtype(dtype)
+        # Writes run in the executor while queries run on the event loop, so the
+        # matrix and the ids/metadata of its rows are swapped in as one tuple
+        self._rows = (None, [], [])
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._rows[1])
+
+    def load(self):
+        """Load a persisted index, memory-mapping the vectors where possible."""
+        if not (os.path.exists(self._matrix_path) and os.path.exists(self._meta_path)):
+            _LOGGER.debug("No local index found on disk")
+            return False
+
+        with open(self._meta_path, 'r') as f:
+            meta = json.load(f)
+
+        matrix = np.load(self._matrix_path, mmap_mode='r')
+        if matrix.dtype != np.float32:
+            # float16 halves the file size, but numpy has no fast float16 matmul,
+            # so keep a float32 copy in memory for querying
+            matrix = np.asarray(matrix, dtype=np.float32)
+
+        self._positions = {vector_id: i for i, vector_id in enumerate(meta["ids"])}
+        self._rows = (matrix, meta["ids"], meta["metadata"])
+        _LOGGER.debug(f"Loaded local index with {len(meta['ids'])} vectors")
+        return True
+
+    def save(self):
+        """Persist the index, replacing the files atomically."""
+        matrix, ids, metadata = self._rows
+        if matrix is None:
+            return
+        os.makedirs(os.path.dirname(self._matrix_path), exist_ok=True)
+
+        tmp_matrix_path = f"{self._matrix_path}.tmp"
+        with open(tmp_matrix_path, 'wb') as f:
+            np.save(f, np.asarray(matrix, dtype=self._dtype))
+        tmp_meta_path = f"{self._meta_path}.tmp"
+        with open(tmp_meta_path, 'w') as f:
+            json.dump({"ids": ids, "metadata": metadata}, f)
+
+        os.replace(tmp_matrix_path, self._matrix_path)
+        os.replace(tmp_meta_path, self._meta_path)
+
+    def clear(self):
+        """Remove all vectors from the index."""
+        self._rows = (None, [], [])
+        self._positions = {}
+
+    def upsert(self, vectors):
+        """Insert or replace Pinecone-style vectors ({"id", "values", "metadata"})."""
+        if not vectors:
+            return
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values /= np.where(norms == 0, 1, norms)
+
+        matrix, ids, metadata = self._rows
+        if matrix is None:
+            matrix = np.empty((0, values.shape[1]), dtype=np.float32)
+        else:
+            # Copy out of the memory map before modifying
+            matrix = np.array(matrix, dtype=np.float32)
+        ids = list(ids)
+        metadata = list(metadata)
+        positions = dict(self._positions)
+
+        new_rows = []
+        for vector, row in zip(vectors, values):
+            position = positions.get(vector["id"])
+            if position is None:
+                positions[vector["id"]] = len(ids)
+                ids.append(vector["id"])
+                metadata.append(vector.get("metadata", {}))
+                new_rows.append(row)
+            else:
+                matrix[position] = row
+                metadata[position] = vector.get("metadata", {})
+
+        if new_rows:
+            matrix = np.vstack([matrix, np.asarray(new_rows, dtype=np.float32)])
+        self._positions = positions
+        self._rows = (matrix, ids, metadata)
+
+    def delete(self, ids):
+        """Remove vectors by id."""
+        remove = {self._positions[vector_id] for vector_id in ids if vector_id in self._positions}
+        if not remove:
+            return
+        matrix, ids, metadata = self._rows
+        keep = [i for i in range(len(ids)) if i not in remove]
+        ids = [ids[i] for i in keep]
+        self._positions = {vector_id: i for i, vector_id in enumerate(ids)}
+        self._rows = (np.array(matrix, dtype=np.float32)[keep], ids, [metadata[i] for i in keep])
+
+    def query(self, vector, top_k=5):
+        """Return the top_k matches in the same shape as a Pinecone query."""
+        matrix, ids, metadata = self._rows
+        if matrix is None or not ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = matrix @ query
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"id": ids[i], "score": float(scores[i]), "metadata": metadata[i]}
+            for i in top
+        ]
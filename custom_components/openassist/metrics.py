@@ -0,0 +1,64 @@
+import math
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+def percentile(samples, fraction):
+    """Return the nearest-rank percentile of samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class PromptTimer:
+    """Collect per-stage latencies (in ms) for a single prompt."""
+
+    def __init__(self, prompt_id=None, timings=None):
+        """Start a new timer, or continue one handed over from another stage."""
+        self.prompt_id = prompt_id or uuid.uuid4().hex[:12]
+        self.timings = dict(timings or {})
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def mark(self, name, since):
+        """Record the ms from since (a perf_counter value) to now as name_at, a point inside a stage."""
+        self.timings.setdefault(f"{name}_at", round((time.perf_counter() - since) * 1000, 1))
+
+    @property
+    def total(self):
+        """Return the sum of all recorded stages, excluding marks."""
+        return round(sum(ms for stage, ms in self.timings.items() if stage != "total" and not stage.endswith("_at")), 1)
+
+
+class LatencyTracker:
+    """Rolling window of stage latencies across prompts."""
+
+    def __init__(self, window):
+        """Initialize the tracker keeping the last window samples per stage."""
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self.last = {}
+
+    def record(self, timings):
+        """Add one prompt's stage latencies."""
+        self.last = dict(timings)
+        for stage, ms in timings.items():
+            self._samples[stage].append(ms)
+
+    def summary(self):
+        """Return p50/p95 per stage, flattened for entity attributes."""
+        summary = {}
+        for stage, samples in self._samples.items():
+            if samples:
+                summary[f"{stage}_p50"] = percentile(samples, 0.5)
+                summary[f"{stage}_p95"] = percentile(samples, 0.95)
+        summary["samples"] = len(self._samples.get("total", ()))
+        return summary
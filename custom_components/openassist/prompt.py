@@ -0,0 +1,110 @@
+import json
+import logging
+
+from .documents import count_tokens
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def build_instructions(your_name):
+    """Return the static instructions that precede every question."""
+    return (
+        "If the query is a generic question, respond with a valid JSON object:\n\n"
+        "{\n"
+        f"  \"message\": \"Generate a humane response (reference current user {your_name})\"\n"
+        "}\n\n"
+
+        "If the query is for the current state of an entity, For example, question: is the (device) on?\n\n"
+        "{\n"
+        "  \"message\": \"The current state of the (original_name) is {{ states() }}\"\n"
+        "}\n\n"
+
+        "device attributes is the following format, {{ state_attr('domain.entity', 'attribute') }}\n\n"
+
+        "If the query requires a call service, please format your response as a valid JSON object in the following way:"
+        "\n\n{\n"
+        "  \"domain\": \"The domain of the service\",\n"
+        "  \"service\": \"The service to be called\",\n"
+        "  \"entity_id\": \"The entity id to be affected\",\n"
+        "  \"data\": {\n"
+        "    \"key1\": \"value1\",\n"
+        "    \"key2\": \"value2\",\n"
+        "    ... and so on ...\n"
+        "  },\n"
+        "  \"message\": \"Confirmation message\"\n"
+        "}\n\n"
+        "For example, if the question asks to play 'Planet Rock' on the Amazon Echo device named 'Loft Echo', "
+        "you should respond with:\n\n"
+        "{\n"
+        "  \"domain\": \"media_player\",\n"
+        "  \"service\": \"play_media\",\n"
+        "  \"entity_id\": \"media_player.loft_echo\",\n"
+        "  \"data\": {\n"
+        "    \"media_content_id\": \"play Planet Rock\",\n"
+        "    \"media_content_type\": \"custom\"\n"
+        "  },\n"
+        "  \"message\": \"(Generate a message confirming completion of task)\"\n"
+        "}\n\n"
+        "Remember, all the keys in the dictionary ('domain', 'service', 'entity_id', 'data', 'message') are required. "
+        "The 'data' key should always have a dictionary as its value, and this dictionary can contain any number of keys "
+        "and values, depending on what the service requires.\n"
+        "If the questions refer to more than 1 actions, reply with the actions under the 'actions' key, and a single 'message' key to represent all actions."
+        "Example:\n\n"
+        "{\n"
+        "  \"actions\": [\n"
+        "    {\n"
+        "      \"domain\": \"The domain of the first service\",\n"
+        "      \"service\": \"The first service to be called\",\n"
+        "      \"entity_id\": \"The entity id to be affected by the first service\",\n"
+        "      \"data\": {\n"
+        "        \"key1\": \"value1\",\n"
+        "        \"key2\": \"value2\",\n"
+        "        ... and so on ...\n"
+        "      }\n"
+        "    },\n"
+        "    {\n"
+        "      \"domain\": \"The domain of the second service\",\n"
+        "      \"service\": \"The second service to be called\",\n"
+        "      \"entity_id\": \"The entity id to be affected by the second service\",\n"
+        "      \"data\": {\n"
+        "        \"key1\": \"value1\",\n"
+        "        \"key2\": \"value2\",\n"
+        "        ... and so on ...\n"
+        "      }\n"
+        "    }\n"
+        "  ],\n"
+        "  \"message\": \"Confirmation message for both the first and second action\"\n"
+        "}\n\n"
+    )
+
+
+class PromptBuilder:
+    """Build LLM prompts from a precompiled instruction prefix within a token budget."""
+
+    def __init__(self, your_name, token_budget):
+        """Compile the instruction prefix once."""
+        self._prefix = build_instructions(your_name)
+        self._prefix_tokens = count_tokens(self._prefix)
+        self._token_budget = token_budget
+
+    def build(self, question, matches, prompt_id=None):
+        """Return the prompt for question and the retrieved matches.
+
+        Each match's metadata is serialized once as compact JSON; the
+        lowest-scoring matches are dropped until the prompt fits the budget.
+        """
+        question_part = f"Question: {question}\n\nData:\n"
+        tokens = self._prefix_tokens + count_tokens(question_part)
+        ranked = sorted(matches, key=lambda match: match.get("score") or 0, reverse=True)
+        lines = []
+        for match in ranked:
+            line = json.dumps(match.get("metadata") or {"entity_id": match.get("id")}, separators=(",", ":"))
+            line_tokens = count_tokens(line) + 1
+            if self._token_budget and tokens + line_tokens > self._token_budget:
+                break
+            lines.append(line)
+            tokens += line_tokens
+        if len(lines) < len(ranked):
+            _LOGGER.warning(f"Prompt {prompt_id}: dropped {len(ranked) - len(lines)} of {len(ranked)} entities to stay within {self._token_budget} tokens")
+        _LOGGER.info(f"Prompt {prompt_id}: {tokens} tokens with {len(lines)} entities")
+        return f"{self._prefix}{question_part}" + "\n".join(lines) + "\n"
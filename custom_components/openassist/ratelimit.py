@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    """Roughly estimate the tokens in text (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def retry_after(headers):
+    """Return the seconds a Retry-After header asks us to wait, or None."""
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allow up to per_minute units per minute, refilled continuously; 0 disables the limit."""
+
+    def __init__(self, per_minute):
+        """Initialize a full bucket."""
+        self._capacity = per_minute
+        self._rate = per_minute / 60
+        self._tokens = per_minute
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def async_acquire(self, amount=1):
+        """Wait until amount units are available and take them, first come first served."""
+        if not self._capacity:
+            return 0.0
+        amount = min(amount, self._capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self._rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class RequestScheduler:
+    """Rate limit, bound and retry the outbound calls to one API.
+
+    Calls are retried with exponential backoff (honoring Retry-After) on 429,
+    5xx, connection errors and timeouts; other errors are raised immediately.
+    """
+
+    def __init__(self, name, max_concurrent, requests_per_minute=0, tokens_per_minute=0, max_retries=5, initial_backoff=1, max_backoff=60):
+        """Initialize the scheduler."""
+        self._name = name
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._max_retries = max_retries
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    async def async_call(self, request, tokens=0):
+        """Return await request(), waiting for capacity and retrying transient failures."""
+        backoff = self._initial_backoff
+        for attempt in range(self._max_retries + 1):
+            self.throttled_seconds += await self._requests.async_acquire(1)
+            if tokens:
+                self.throttled_seconds += await self._tokens.async_acquire(tokens)
+            async with self._semaphore:
+                try:
+                    return await request()
+                except aiohttp.ClientResponseError as err:
+                    if (err.status != 429 and err.status < 500) or attempt == self._max_retries:
+                        raise
+                    delay = retry_after(err.headers)
+                    reason = f"HTTP {err.status}"
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                    if attempt == self._max_retries:
+                        raise
+                    delay = None
+                    reason = str(err) or type(err).__name__
+            if delay is None:
+                # Jitter keeps concurrent callers from retrying in lockstep
+                delay = backoff * random.uniform(0.5, 1.0)
+            backoff = min(backoff * 2, self._max_backoff)
+            self.retries += 1
+            _LOGGER.warning(f"{self._name} request failed ({reason}), retrying in {delay:.1f}s (attempt {attempt + 1} of {self._max_retries})")
+            await asyncio.sleep(delay)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+import homeassistant.util.dt as dt_util
+
+from .lexical import MIN_SIMILARITY, trigrams, words
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def is_correction(previous, prompt):
+    """Return True if prompt looks like a revision of previous rather than a separate command.
+
+    That is the same words, one extending the other (a transcript being
+    completed), or the same words with a single one respelt.
+    """
+    old, new = words(previous), words(prompt)
+    shorter = min(len(old), len(new))
+    if old[:shorter] == new[:shorter]:
+        return True
+    if len(old) != len(new):
+        return False
+    changed = [(a, b) for a, b in zip(old, new) if a != b]
+    if len(changed) != 1:
+        return False
+    a, b = (trigrams(word) for word in changed[0])
+    return len(a & b) / len(a | b) >= MIN_SIMILARITY
+
+
+class PromptJob:
+    """One prompt travelling through the pipeline."""
+
+    def __init__(self, seq, prompt):
+        """Initialize the job."""
+        self.seq = seq
+        self.prompt = prompt
+        self.prompt_id = uuid.uuid4().hex[:12]
+        self.created = time.monotonic()
+        self.queue_ms = None
+        self.running = False
+        self.executing = False
+        self.tasks = set()
+        self.finished = asyncio.Event()
+
+
+class PromptScheduler:
+    """Debounce, bound, order and cancel prompts written to input_text.openassist_prompt.
+
+    A prompt is handed to handler(job), which returns True once it has passed the
+    prompt on to the sensor; the job then stays open until the sensor calls
+    async_finish. Actions run in submission order, and a correction of an older
+    prompt (see is_correction) cancels it if it has not started executing
+    actions within supersede_window. Different prompts arriving together, e.g.
+    from several rooms, all run. Prompts are dispatched immediately unless an
+    earlier one is still in flight, in which case they wait debounce seconds
+    for further corrections.
+    """
+
+    def __init__(self, hass, handler, debounce, max_concurrent, max_queue, supersede_window, finish_timeout, cancelled_signal=None):
+        """Initialize the scheduler."""
+        self._hass = hass
+        self._handler = handler
+        self._debounce = debounce
+        self._max_queue = max_queue
+        self._supersede_window = supersede_window
+        self._finish_timeout = finish_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._jobs = OrderedDict()
+        self._cancelled = deque(maxlen=100)
+        self._cancelled_signal = cancelled_signal
+        # The latest dropped prompts and why, shown on the response sensor
+        self.cancelled_prompts = deque(maxlen=10)
+        self._pending_prompt = None
+        self._debounce_handle = None
+        self._seq = 0
+
+    @callback
+    def async_submit(self, prompt):
+        """Accept a prompt, collapsing prompts that arrive within the debounce window."""
+        if self._debounce_handle is not None:
+            self._debounce_handle.cancel()
+            self._debounce_handle = None
+            if is_correction(self._pending_prompt, prompt):
+                _LOGGER.debug(f"Prompt '{self._pending_prompt}' replaced by '{prompt}' within the debounce window")
+                self._async_record_cancelled(None, self._pending_prompt, "replaced within the debounce window")
+            else:
+                # A different command goes ahead on its own
+                self._async_dispatch()
+        self._pending_prompt = prompt
+        if self._debounce > 0 and any(not job.executing for job in self._jobs.values()):
+            self._debounce_handle = self._hass.loop.call_later(self._debounce, self._async_dispatch)
+        else:
+            self._async_dispatch()
+
+    @callback
+    def _async_dispatch(self):
+        prompt = self._pending_prompt
+        self._pending_prompt = None
+        self._debounce_handle = None
+
+        now = time.monotonic()
+        for job in list(self._jobs.values()):
+            if not job.executing and now - job.created <= self._supersede_window and is_correction(job.prompt, prompt):
+                self._async_cancel(job, "superseded by a newer prompt")
+
+        waiting = [job for job in self._jobs.values() if not job.running]
+        while waiting and len(waiting) >= self._max_queue:
+            self._async_cancel(waiting.pop(0), "prompt queue is full")
+
+        self._seq += 1
+        job = PromptJob(self._seq, prompt)
+        self._jobs[job.prompt_id] = job
+        job.tasks.add(self._hass.async_create_task(self._async_run(job)))
+
+    async def _async_run(self, job):
+        try:
+            async with self._semaphore:
+                job.running = True
+                job.queue_ms = round((time.monotonic() - job.created) * 1000, 1)
+                try:
+                    handed_over = await self._handler(job)
+                except Exception:  # pylint: disable=broad-except
+                    _LOGGER.exception(f"Handling prompt {job.prompt_id} ('{job.prompt}') failed")
+                    return
+                if handed_over:
+                    try:
+                        await asyncio.wait_for(job.finished.wait(), self._finish_timeout)
+                    except asyncio.TimeoutError:
+                        _LOGGER.warning(f"Prompt {job.prompt_id} did not finish within {self._finish_timeout}s")
+        finally:
+            self.async_finish(job.prompt_id)
+
+    @callback
+    def _async_cancel(self, job, reason):
+        _LOGGER.info(f"Cancelling prompt {job.prompt_id} ('{job.prompt}'): {reason}")
+        self._cancelled.append(job.prompt_id)
+        self._async_record_cancelled(job.prompt_id, job.prompt, reason)
+        current = asyncio.current_task()
+        for task in job.tasks:
+            if task is not current:
+                task.cancel()
+        self.async_finish(job.prompt_id)
+
+    @callback
+    def _async_record_cancelled(self, prompt_id, prompt, reason):
+        self.cancelled_prompts.append({
+            "prompt_id": prompt_id,
+            "prompt": prompt,
+            "reason": reason,
+            "time": dt_util.utcnow().isoformat(),
+        })
+        if self._cancelled_signal is not None:
+            async_dispatcher_send(self._hass, self._cancelled_signal)
+
+    @callback
+    def async_attach(self, prompt_id):
+        """Register the current task as working on prompt_id; False if it was cancelled."""
+        if prompt_id in self._cancelled:
+            return False
+        job = self._jobs.get(prompt_id)
+        if job is not None:
+            job.tasks.add(asyncio.current_task())
+        return True
+
+    async def async_wait_turn(self, prompt_id):
+        """Wait until every earlier prompt is done, then mark this one as executing."""
+        job = self._jobs.get(prompt_id)
+        if job is None:
+            return
+        earlier = [other.finished.wait() for other in self._jobs.values() if other.seq < job.seq]
+        if earlier:
+            try:
+                await asyncio.wait_for(asyncio.gather(*earlier), self._finish_timeout)
+            except asyncio.TimeoutError:
+                _LOGGER.warning(f"Prompt {prompt_id} stopped waiting for earlier prompts")
+        job.executing = True
+
+    @callback
+    def async_finish(self, prompt_id):
+        """Mark a prompt as done, releasing later prompts waiting for their turn."""
+        job = self._jobs.pop(prompt_id, None)
+        if job is not None:
+            job.finished.set()
@@ -1,28 +1,51 @@
+import asyncio
 import logging
+import time
 import aiohttp
 import voluptuous as vol
 import json
 import yaml
 
 from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.dispatcher import async_dispatcher_connect, async_dispatcher_send
 from homeassistant.components.sensor import PLATFORM_SCHEMA
 from homeassistant.const import CONF_NAME
 import homeassistant.helpers.config_validation as cv
 
-from . import DOMAIN, EVENT_OPENASSIST_UPDATE
+from . import DOMAIN, EVENT_OPENASSIST_UPDATE, SIGNAL_LATENCY_UPDATED, SIGNAL_PROMPT_CANCELLED, async_request_json
+from .actions import ActionExecutor, async_execute_actions
+from .metrics import PromptTimer
+from .prompt import PromptBuilder
+from .streaming import StreamingResponseParser, async_stream_chat_completion
 
 DEFAULT_NAME = "OpenAssist Response"
+DIAGNOSTICS_NAME = "OpenAssist Diagnostics"
+
+MINDSDB_URL = "https://cloud.mindsdb.com"
+DEFAULT_SERVICE_CONCURRENCY = 4
+DEFAULT_SERVICE_TIMEOUT = 10
+DEFAULT_PROMPT_TOKEN_BUDGET = 2000
+
+LLM_BACKEND_MINDSDB = "mindsdb"
+LLM_BACKEND_OPENAI = "openai"
+DEFAULT_OPENAI_MODEL = "gpt-4"
 
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
 #    vol.Required('mindsdb_cookie'): cv.string,
-    vol.Required('mindsdb_model'): cv.string,
-    vol.Required('mindsdb_email'): cv.string,
-    vol.Required('mindsdb_password'): cv.string,
+    vol.Optional('llm_backend', default=LLM_BACKEND_MINDSDB): vol.In([LLM_BACKEND_MINDSDB, LLM_BACKEND_OPENAI]),
+    vol.Optional('mindsdb_model'): cv.string,
+    vol.Optional('mindsdb_email'): cv.string,
+    vol.Optional('mindsdb_password'): cv.string,
     vol.Optional('notify_device'): cv.string,
     vol.Optional('your_name'): cv.string,
+    vol.Optional('mindsdb_url', default=MINDSDB_URL): cv.string,
+    vol.Optional('service_concurrency', default=DEFAULT_SERVICE_CONCURRENCY): cv.positive_int,
+    vol.Optional('service_timeout', default=DEFAULT_SERVICE_TIMEOUT): cv.positive_float,
+    vol.Optional('openai_model', default=DEFAULT_OPENAI_MODEL): cv.string,
+    vol.Optional('stream', default=True): cv.boolean,
+    vol.Optional('prompt_token_budget', default=DEFAULT_PROMPT_TOKEN_BUDGET): cv.positive_int,
 })
 
 
@@ -34,13 +57,29 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     _LOGGER.debug("Setting up OpenAssistSensor")
 
     name = config.get(CONF_NAME, DEFAULT_NAME)
-    mindsdb_model = config['mindsdb_model']
-    mindsdb_email = config['mindsdb_email']
-    mindsdb_password = config['mindsdb_password']
+    llm_backend = config.get('llm_backend', LLM_BACKEND_MINDSDB)
+    mindsdb_model = config.get('mindsdb_model')
+    mindsdb_email = config.get('mindsdb_email')
+    mindsdb_password = config.get('mindsdb_password')
+    if llm_backend == LLM_BACKEND_MINDSDB and not all([mindsdb_model, mindsdb_email, mindsdb_password]):
+        _LOGGER.error("mindsdb_model, mindsdb_email and mindsdb_password are required for the mindsdb llm_backend")
+        return
     notify_device = config.get('notify_device', '')
     your_name = config.get('your_name', '')
-
-    add_entities([OpenAssistSensor(name, mindsdb_model, mindsdb_email, mindsdb_password, notify_device, your_name)])
+    mindsdb_url = config.get('mindsdb_url', MINDSDB_URL)
+    service_concurrency = config.get('service_concurrency', DEFAULT_SERVICE_CONCURRENCY)
+    service_timeout = config.get('service_timeout', DEFAULT_SERVICE_TIMEOUT)
+    openai_model = config.get('openai_model', DEFAULT_OPENAI_MODEL)
+    stream = config.get('stream', True)
+    prompt_token_budget = config.get('prompt_token_budget', DEFAULT_PROMPT_TOKEN_BUDGET)
+
+    add_entities([
+        OpenAssistSensor(
+            name, mindsdb_model, mindsdb_email, mindsdb_password, notify_device, your_name, mindsdb_url,
+            service_concurrency, service_timeout, llm_backend, openai_model, stream, prompt_token_budget,
+        ),
+        OpenAssistDiagnosticsSensor(DIAGNOSTICS_NAME),
+    ])
     _LOGGER.debug("OpenAssistSensor added to entities")
 
 
@@ -52,6 +91,30 @@ class OpenAssistSensor(Entity):
 
 
 
+    async def ask_llm(self, prompt):
+        """Ask the configured LLM backend for a complete response."""
+        if self._llm_backend == LLM_BACKEND_OPENAI:
+            return await self.ask_openai(prompt)
+        return await self.ask_mindsdb(prompt)
+
+    async def ask_openai(self, prompt):
+        _LOGGER.debug("Asking OpenAI")
+        openai = self.hass.data[DOMAIN]["openai"]
+        try:
+            response_json = await async_request_json(
+                self.hass.data[DOMAIN]["session"],
+                "POST",
+                f"{openai['api_base']}/chat/completions",
+                {"Authorization": f"Bearer {openai['api_key']}"},
+                {"model": self._openai_model, "messages": [{"role": "user", "content": prompt}]},
+            )
+            return response_json['choices'][0]['message']['content']
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.error(f"OpenAI request failed: {err}")
+        except (KeyError, IndexError, TypeError):
+            _LOGGER.error(f"Unexpected response structure: {response_json}")
+        return None
+
     async def ask_mindsdb(self, prompt):
         _LOGGER.debug("Asking MindsDB")
 
@@ -64,34 +127,29 @@ class OpenAssistSensor(Entity):
         # Replace all double quotes except for the ones at the start and end
         sanitized_prompt = '"' + prompt[1:-1].replace('"', '') + '"'
 
-        # Create a ClientSession that will be used for both authentication and querying
-        async with aiohttp.ClientSession() as session:
-
-            # Login
-            login_url = "https://cloud.mindsdb.com/cloud/login"
-            login_data = {
-                'email': self._mindsdb_email,
-                'password': self._mindsdb_password
-            }
-            login_response = await session.post(login_url, json=login_data)
-            
-            if login_response.status != 200:
-                _LOGGER.error(f"Login request failed with status {login_response.status}: {login_response.reason}")
-                return None
-
-            # Query MindsDB
-            query_url = 'https://cloud.mindsdb.com/api/sql/query'
-            query_data = {
-                'query': f"SELECT response from mindsdb.{self._mindsdb_model} WHERE text={sanitized_prompt};"
-            }
-            query_response = await session.post(query_url, json=query_data)
-            
-            if query_response.status != 200:
-                _LOGGER.error(f"Query request failed with status {query_response.status}: {query_response.reason}")
+        # Log in once and keep the session cookie for later prompts
+        if not self._login_generation and not await self._async_login(self._login_generation):
+            return None
+
+        # Query MindsDB
+        query_url = f"{self._mindsdb_url}/api/sql/query"
+        query_data = {
+            'query': f"SELECT response from mindsdb.{self._mindsdb_model} WHERE text={sanitized_prompt};"
+        }
+        for attempt in range(2):
+            generation = self._login_generation
+            async with self._get_session().post(query_url, json=query_data) as query_response:
+                if query_response.status in (401, 403) and not attempt:
+                    _LOGGER.debug("MindsDB session expired, logging in again")
+                elif query_response.status != 200:
+                    _LOGGER.error(f"Query request failed with status {query_response.status}: {query_response.reason}")
+                    return None
+                else:
+                    response_json = await query_response.json()
+                    break
+            if not await self._async_login(generation):
                 return None
 
-            response_json = await query_response.json()
-
         _LOGGER.info(f"MindsDB response: {response_json}")
         
         try:
@@ -106,7 +164,46 @@ class OpenAssistSensor(Entity):
 
 
 
-    def __init__(self, name, mindsdb_model, mindsdb_email, mindsdb_password, notify_device, your_name):
+    def _get_session(self):
+        """Return the persistent MindsDB session, pooled on the integration's connector."""
+        if self._session is None or self._session.closed:
+            shared_session = self.hass.data.get(DOMAIN, {}).get("session")
+            if shared_session is not None and not shared_session.closed:
+                self._session = aiohttp.ClientSession(
+                    connector=shared_session.connector,
+                    connector_owner=False,
+                    timeout=shared_session.timeout,
+                )
+            else:
+                self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def _async_login(self, generation):
+        """Log in to MindsDB, unless another prompt already did since generation was read."""
+        async with self._login_lock:
+            if self._login_generation != generation:
+                return True
+
+            session = self._get_session()
+            session.cookie_jar.clear()
+            login_url = f"{self._mindsdb_url}/cloud/login"
+            login_data = {
+                'email': self._mindsdb_email,
+                'password': self._mindsdb_password
+            }
+            async with session.post(login_url, json=login_data) as login_response:
+                if login_response.status != 200:
+                    _LOGGER.error(f"Login request failed with status {login_response.status}: {login_response.reason}")
+                    return False
+
+            self._login_generation += 1
+            _LOGGER.debug("Logged in to MindsDB")
+            return True
+
+    def __init__(self, name, mindsdb_model, mindsdb_email, mindsdb_password, notify_device, your_name, mindsdb_url=MINDSDB_URL,
+                 service_concurrency=DEFAULT_SERVICE_CONCURRENCY, service_timeout=DEFAULT_SERVICE_TIMEOUT,
+                 llm_backend=LLM_BACKEND_MINDSDB, openai_model=DEFAULT_OPENAI_MODEL, stream=True,
+                 prompt_token_budget=DEFAULT_PROMPT_TOKEN_BUDGET):
         """Initialize the sensor."""
         self._state = None
         self._name = name
@@ -117,6 +214,20 @@ class OpenAssistSensor(Entity):
         self._mindsdb_password = mindsdb_password
         self._notify_device = notify_device
         self._your_name = your_name
+        self._prompt_builder = PromptBuilder(your_name, prompt_token_budget)
+        self._mindsdb_url = mindsdb_url
+        self._service_concurrency = service_concurrency
+        self._service_timeout = service_timeout
+        self._service_results = None
+        self._llm_backend = llm_backend
+        self._openai_model = openai_model
+        # Only the OpenAI chat completions API can stream its output
+        self._stream = stream and llm_backend == LLM_BACKEND_OPENAI
+        self._prompt_id = None
+        self._timings = None
+        self._session = None
+        self._login_lock = asyncio.Lock()
+        self._login_generation = 0
         _LOGGER.info("OpenAssistSensor initialized")
 
     @property
@@ -132,120 +243,199 @@ class OpenAssistSensor(Entity):
     @property
     def extra_state_attributes(self):
         """Return the state attributes of the sensor."""
-        return {"response": self._response, "message": self._message} 
+        attributes = {
+            "response": self._response,
+            "message": self._message,
+            "prompt_id": self._prompt_id,
+            "timings": self._timings,
+            "service_results": self._service_results,
+        }
+        embedding_cache = self.hass.data.get(DOMAIN, {}).get("embedding_cache") if self.hass else None
+        if embedding_cache is not None:
+            attributes.update(embedding_cache.stats)
+        response_cache = self.hass.data.get(DOMAIN, {}).get("response_cache") if self.hass else None
+        if response_cache is not None:
+            attributes.update(response_cache.stats)
+        scheduler = self.hass.data.get(DOMAIN, {}).get("scheduler") if self.hass else None
+        if scheduler is not None:
+            # Why a command never ran: debounced, superseded or dropped from a full queue
+            attributes["cancelled_prompts"] = list(scheduler.cancelled_prompts)
+        return attributes
 
     async def async_added_to_hass(self):
         """Run when entity about to be added to hass."""
         _LOGGER.info("OpenAssistSensor added to hass, connecting to OpenAssist update event")
         self.hass.bus.async_listen(EVENT_OPENASSIST_UPDATE, self._async_handle_update)
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, SIGNAL_PROMPT_CANCELLED, self.async_write_ha_state)
+        )
         _LOGGER.info("OpenAssistSensor connected to OpenAssist update event")
 
+    async def async_will_remove_from_hass(self):
+        """Close the MindsDB session."""
+        if self._session is not None:
+            await self._session.close()
+
 
     async def _async_handle_update(self, event):
         """Handle the OpenAssist update event."""
         _LOGGER.info("OpenAssistSensor received update event")
+        scheduler = self.hass.data.get(DOMAIN, {}).get("scheduler")
+        prompt_id = event.data.get("prompt_id")
+        if scheduler is None:
+            await self._async_process_update(event)
+            return
+        if not scheduler.async_attach(prompt_id):
+            _LOGGER.info(f"Prompt {prompt_id} was superseded. Skipping...")
+            return
+        try:
+            await self._async_process_update(event)
+        finally:
+            scheduler.async_finish(prompt_id)
+
+    async def _async_process_update(self, event):
+        """Ask the LLM, execute the response and notify."""
         new_state = event.data.get("new_state", "")
         if not new_state:
             _LOGGER.info("Input text is empty. Skipping...")
             return
-        metadata = event.data.get("metadata", "")
-        _LOGGER.info(f"Event data: new_state={new_state}, metadata={metadata}")
-
-        
-        prompt = (
-            "If the query is a generic question, respond with a valid JSON object:\n\n"
-            "{\n"
-            f"  \"message\": \"Generate a humane response (reference current user {self._your_name})\"\n"
-            "}\n\n"
-
-            "If the query is for the current state of an entity, For example, question: is the (device) on?\n\n"
-            "{\n"
-            "  \"message\": \"The current state of the (original_name) is {{ states() }}\"\n"
-            "}\n\n"
-            
-            "device attributes is the following format, {{ state_attr('domain.entity', 'attribute') }}\n\n"
-
-            "If the query requires a call service, please format your response as a valid JSON object in the following way:"
-            "\n\n{\n"
-            "  \"domain\": \"The domain of the service\",\n"
-            "  \"service\": \"The service to be called\",\n"
-            "  \"entity_id\": \"The entity id to be affected\",\n"
-            "  \"data\": {\n"
-            "    \"key1\": \"value1\",\n"
-            "    \"key2\": \"value2\",\n"
-            "    ... and so on ...\n"
-            "  },\n"
-            "  \"message\": \"Confirmation message\"\n"
-            "}\n\n"
-            "For example, if the question asks to play 'Planet Rock' on the Amazon Echo device named 'Loft Echo', "
-            "you should respond with:\n\n"
-            "{\n"
-            "  \"domain\": \"media_player\",\n"
-            "  \"service\": \"play_media\",\n"
-            "  \"entity_id\": \"media_player.loft_echo\",\n"
-            "  \"data\": {\n"
-            "    \"media_content_id\": \"play Planet Rock\",\n"
-            "    \"media_content_type\": \"custom\"\n"
-            "  },\n"
-            "  \"message\": \"(Generate a message confirming completion of task)\"\n"
-            "}\n\n"
-            "Remember, all the keys in the dictionary ('domain', 'service', 'entity_id', 'data', 'message') are required. "
-            "The 'data' key should always have a dictionary as its value, and this dictionary can contain any number of keys "
-            "and values, depending on what the service requires.\n"
-            "If the questions refer to more than 1 actions, reply with the actions under the 'actions' key, and a single 'message' key to represent all actions."
-            "Example:\n\n"
-            "{\n"
-            "  \"actions\": [\n"
-            "    {\n"
-            "      \"domain\": \"The domain of the first service\",\n"
-            "      \"service\": \"The first service to be called\",\n"
-            "      \"entity_id\": \"The entity id to be affected by the first service\",\n"
-            "      \"data\": {\n"
-            "        \"key1\": \"value1\",\n"
-            "        \"key2\": \"value2\",\n"
-            "        ... and so on ...\n"
-            "      }\n"
-            "    },\n"
-            "    {\n"
-            "      \"domain\": \"The domain of the second service\",\n"
-            "      \"service\": \"The second service to be called\",\n"
-            "      \"entity_id\": \"The entity id to be affected by the second service\",\n"
-            "      \"data\": {\n"
-            "        \"key1\": \"value1\",\n"
-            "        \"key2\": \"value2\",\n"
-            "        ... and so on ...\n"
-            "      }\n"
-            "    }\n"
-            "  ],\n"
-            "  \"message\": \"Confirmation message for both the first and second action\"\n"
-            "}\n\n"
-            f"Question: {new_state}\n\nData: {json.dumps(metadata, indent=4)}\n"
-        )
-
-
-
-        _LOGGER.info(f"Prepared prompt for GPT-4: {prompt}")
+        matches = event.data.get("matches") or []
+        timer = PromptTimer(event.data.get("prompt_id"), event.data.get("timings"))
+        _LOGGER.info(f"Event data: prompt_id={timer.prompt_id}, new_state={new_state}, matches={[match.get('id') for match in matches]}")
 
+        # A response may already be known, e.g. from the response cache
+        response = event.data.get("response")
+        if response is None:
+            with timer.stage("prompt"):
+                prompt = self._prompt_builder.build(new_state, matches, timer.prompt_id)
+            _LOGGER.info(f"Prepared prompt for GPT-4: {prompt}")
 
         _LOGGER.info("Getting GPT-4 response")
-        response = await self.ask_mindsdb(prompt)
+        if response is None and self._stream:
+            await self._async_stream_response(prompt, timer)
+            self._record_timings(timer)
+            _LOGGER.info("Updating Home Assistant state")
+            self.async_schedule_update_ha_state()
+            return
+        if response is None:
+            with timer.stage("llm"):
+                response = await self.ask_llm(prompt)
+            self._cache_response(timer.prompt_id, response)
         self._response = response  
         _LOGGER.info(f'GPT Response: \n{response}')
         self._state = 'Response received'  
+        scheduler = self.hass.data.get(DOMAIN, {}).get("scheduler")
+        if scheduler is not None:
+            # Keep actions in the order the prompts were given
+            with timer.stage("wait_turn"):
+                await scheduler.async_wait_turn(timer.prompt_id)
         _LOGGER.info("Executing service")
-        await self.execute_service(self.hass, response)
+        with timer.stage("execute_service"):
+            await self.execute_service(self.hass, response)
         _LOGGER.info("Sending notification")
-        message = json.loads(response).get('message') if response else None
-        if message:  
-            message = self.hass.helpers.template.Template(message, self.hass).async_render()
+        with timer.stage("template"):
+            message = json.loads(response).get('message') if response else None
+            if message:  
+                message = self.hass.helpers.template.Template(message, self.hass).async_render()
         self._message = message
-        await self.send_notification(message)
+        with timer.stage("notify"):
+            await self.send_notification(message)
+        self._record_timings(timer)
         _LOGGER.info("Updating Home Assistant state")
         self.async_schedule_update_ha_state()
         _LOGGER.info("Home Assistant state updated")
 
+    async def _async_stream_response(self, prompt, timer):
+        """Stream the OpenAI response, running each action and the notification as soon as they are complete."""
+        openai = self.hass.data[DOMAIN]["openai"]
+        scheduler = self.hass.data.get(DOMAIN, {}).get("scheduler")
+        # Actions still run in the order the prompts were given
+        before = (lambda: scheduler.async_wait_turn(timer.prompt_id)) if scheduler is not None else None
+        executor = ActionExecutor(self.hass, self._service_concurrency, self._service_timeout, before)
+        parser = StreamingResponseParser()
+        notify_task = None
+        deferred_message = None
+        start = time.perf_counter()
+        try:
+            try:
+                async for chunk in async_stream_chat_completion(
+                    self.hass.data[DOMAIN]["session"], openai['api_base'], openai['api_key'], self._openai_model, prompt
+                ):
+                    timer.mark("llm_first_token", start)
+                    for kind, value in parser.feed(chunk):
+                        if kind == "action":
+                            _LOGGER.debug(f"Streamed action for prompt {timer.prompt_id}: {value}")
+                            executor.submit([value])
+                        elif "{{" in value:
+                            # A templated message reports state, so render it once the actions have run
+                            deferred_message = value
+                        elif notify_task is None:
+                            timer.mark("llm_message", start)
+                            notify_task = asyncio.ensure_future(self._async_notify(value))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+                _LOGGER.error(f"OpenAI streaming request failed: {err}")
+            timer.timings["llm"] = round((time.perf_counter() - start) * 1000, 1)
+
+            response_dict = parser.result()
+            self._response = json.dumps(response_dict) if response_dict is not None else parser.text or None
+            _LOGGER.info(f'GPT Response: \n{self._response}')
+            self._state = 'Response received'
+            if isinstance(response_dict, dict):
+                actions = response_dict.get('actions')
+                if isinstance(actions, list):
+                    executor.submit(actions[parser.actions_emitted:])
+                elif 'service' in response_dict:
+                    executor.submit([response_dict])
+                if notify_task is None and deferred_message is None:
+                    deferred_message = response_dict.get('message')
+                self._cache_response(timer.prompt_id, self._response)
+            else:
+                _LOGGER.error("Could not decode response as JSON")
+
+            with timer.stage("execute_service"):
+                self._service_results = await executor.async_results()
+            with timer.stage("notify"):
+                if notify_task is None:
+                    notify_task = asyncio.ensure_future(self._async_notify(deferred_message))
+                await notify_task
+        finally:
+            # Nothing is left running if the prompt was superseded or failed
+            executor.cancel()
+            if notify_task is not None:
+                notify_task.cancel()
+
+    async def _async_notify(self, message):
+        """Render the message template and send it to the notify device."""
+        if message:
+            message = self.hass.helpers.template.Template(message, self.hass).async_render()
+        self._message = message
+        await self.send_notification(message)
+
+    def _cache_response(self, prompt_id, response):
+        """Offer a valid JSON response to the response cache."""
+        response_cache = self.hass.data.get(DOMAIN, {}).get("response_cache")
+        if response_cache is None or not response:
+            return
+        try:
+            json.loads(response)
+        except json.JSONDecodeError:
+            return
+        response_cache.store(prompt_id, response)
+
+    def _record_timings(self, timer):
+        """Expose the prompt's stage latencies and feed the rolling diagnostics."""
+        timer.timings["total"] = timer.total
+        self._prompt_id = timer.prompt_id
+        self._timings = timer.timings
+        _LOGGER.debug(f"Prompt {timer.prompt_id} timings (ms): {timer.timings}")
+        tracker = self.hass.data.get(DOMAIN, {}).get("latency")
+        if tracker is not None:
+            tracker.record(timer.timings)
+            async_dispatcher_send(self.hass, SIGNAL_LATENCY_UPDATED)
+
 
     async def execute_service(self, hass, response):
+        self._service_results = None
         if not response:
             _LOGGER.error("No response to execute")
             return
@@ -261,23 +451,18 @@ class OpenAssistSensor(Entity):
 
         actions = response_dict.get('actions')
         if actions is None:  # if 'actions' key is not present, assume it's a single-action response
+            if 'service' not in response_dict:
+                _LOGGER.debug("Response has no service to call")
+                return
             actions = [response_dict]  # wrap it into a list to make it compatible with the loop below
 
         if not actions:
             _LOGGER.error("No actions in response")
             return
 
-        for action in actions:
-            domain = action.get('domain')
-            service = action.get('service')
-            entity_id = action.get('entity_id')
-            data = action.get('data', {})  
-            if not all([domain, service, entity_id]):
-                _LOGGER.error("Action missing required fields")
-                continue
-            if 'entity_id' not in data:
-                data['entity_id'] = entity_id
-            await hass.services.async_call(domain, service, data)
+        self._service_results = await async_execute_actions(
+            hass, actions, self._service_concurrency, self._service_timeout
+        )
 
 
 
@@ -286,3 +471,52 @@ class OpenAssistSensor(Entity):
             _LOGGER.error("No message to send")
             return
         await self.hass.services.async_call("notify", self._notify_device, {"message": message})
+
+
+class OpenAssistDiagnosticsSensor(Entity):
+    """Rolling p50/p95 latency per prompt pipeline stage."""
+
+    def __init__(self, name):
+        """Initialize the sensor."""
+        self._name = name
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def should_poll(self):
+        """Updates are pushed after every prompt."""
+        return False
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of the state."""
+        return "ms"
+
+    @property
+    def _tracker(self):
+        return self.hass.data.get(DOMAIN, {}).get("latency") if self.hass else None
+
+    @property
+    def state(self):
+        """Return the total latency of the last prompt."""
+        tracker = self._tracker
+        return tracker.last.get("total") if tracker else None
+
+    @property
+    def extra_state_attributes(self):
+        """Return p50/p95 per stage and the prompt embedding batch figures."""
+        tracker = self._tracker
+        attributes = tracker.summary() if tracker else {}
+        batcher = self.hass.data.get(DOMAIN, {}).get("embedding_batcher") if self.hass else None
+        if batcher is not None:
+            attributes.update(batcher.stats)
+        return attributes
+
+    async def async_added_to_hass(self):
+        """Refresh whenever a prompt finishes."""
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, SIGNAL_LATENCY_UPDATED, self.async_write_ha_state)
+        )
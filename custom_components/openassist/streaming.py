@@ -0,0 +1,130 @@
+import json
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_stream_chat_completion(session, api_base, api_key, model, prompt):
+    """Yield the content deltas of a streamed OpenAI chat completion."""
+    async with session.post(
+        f"{api_base}/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        json={"model": model, "messages": [{"role": "user", "content": prompt}], "stream": True},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.content:
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            choices = json.loads(data).get("choices") or []
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if content:
+                yield content
+
+
+class StreamingResponseParser:
+    """Incrementally scan the LLM's JSON response as it streams in.
+
+    feed() returns ("message", text) once the top-level message string is
+    complete and ("action", dict) for each object in the top-level actions
+    array as soon as it closes. Anything before the first "{" (e.g. a code
+    fence) is ignored.
+    """
+
+    def __init__(self):
+        """Initialize the parser."""
+        self.text = ""
+        self._pos = 0
+        self._start = None
+        self._end = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._string_start = None
+        self._key = None
+        self._last_string = None
+        self._actions_depth = None
+        self._action_start = None
+        self.actions_emitted = 0
+
+    def feed(self, chunk):
+        """Add a chunk of text and return the events it completed."""
+        self.text += chunk
+        events = []
+        text = self.text
+        while self._pos < len(text) and self._end is None:
+            char = text[self._pos]
+            index = self._pos
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._end_string(index, events)
+                continue
+
+            if self._start is None:
+                if char == "{":
+                    self._start = index
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._key == "actions":
+                    self._actions_depth = 2
+                elif char == "{" and self._actions_depth is not None and self._depth == 3:
+                    self._action_start = index
+            elif char in "}]":
+                if char == "}" and self._action_start is not None and self._depth == 3:
+                    try:
+                        events.append(("action", json.loads(text[self._action_start:index + 1])))
+                        self.actions_emitted += 1
+                    except ValueError as err:
+                        _LOGGER.debug(f"Could not parse streamed action: {err}")
+                    self._action_start = None
+                elif char == "]" and self._depth == 2:
+                    self._actions_depth = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end = index + 1
+            elif self._depth == 1:
+                if char == ":":
+                    self._expect_key = False
+                    self._key = self._last_string
+                elif char == ",":
+                    self._expect_key = True
+        return events
+
+    def _end_string(self, index, events):
+        if self._depth != 1:
+            return
+        try:
+            value = json.loads(self.text[self._string_start:index + 1])
+        except ValueError:
+            return
+        if self._expect_key:
+            self._last_string = value
+        elif self._key == "message":
+            events.append(("message", value))
+
+    def result(self):
+        """Return the complete response object, or None if it is not valid JSON."""
+        if self._start is None:
+            return None
+        try:
+            return json.loads(self.text[self._start:self._end])
+        except ValueError:
+            return None
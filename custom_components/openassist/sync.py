@@ -0,0 +1,99 @@
+import enum
+import hashlib
+import json
+import logging
+import os
+
+_LOGGER = logging.getLogger(__name__)
+
+# Fields of an entity registry entry, as stored in core.entity_registry
+REGISTRY_FIELDS = (
+    "aliases",
+    "area_id",
+    "capabilities",
+    "config_entry_id",
+    "device_class",
+    "device_id",
+    "disabled_by",
+    "entity_category",
+    "entity_id",
+    "hidden_by",
+    "icon",
+    "id",
+    "name",
+    "original_device_class",
+    "original_icon",
+    "original_name",
+    "platform",
+    "translation_key",
+    "unique_id",
+    "unit_of_measurement",
+)
+
+
+def registry_entry_to_dict(entry):
+    """Convert an in-memory registry entry to the dict format of the storage file."""
+    entity = {}
+    for field in REGISTRY_FIELDS:
+        value = getattr(entry, field, None)
+        if isinstance(value, (set, frozenset)):
+            value = sorted(value)
+        elif isinstance(value, enum.Enum):
+            value = value.value
+        entity[field] = value
+    return entity
+
+
+def entity_metadata(entity):
+    """Return the metadata stored with an entity's vector."""
+    return {field: str(entity[field]) for field in ["entity_id", "original_name", "platform"] if field in entity}
+
+
+def content_hash(text):
+    """Return a stable hash of the embedded text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IndexManifest:
+    """Record of which entity text is currently stored in the index, keyed by vector id."""
+
+    def __init__(self, path):
+        """Initialize an empty manifest stored at path."""
+        self._path = path
+        self.target = None
+        # Embedding backend and model the vectors were created with
+        self.model = None
+        self.hashes = {}
+        # Set while a full build runs, so an interrupted build is resumed at startup
+        self.building = False
+
+    def load(self):
+        """Load the manifest from disk if it exists."""
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as err:
+            _LOGGER.warning(f"Unable to load index manifest, the next sync will re-embed everything: {err}")
+            return
+        self.target = data.get("target")
+        self.model = data.get("model")
+        self.hashes = data.get("hashes", {})
+        self.building = data.get("building", False)
+
+    def save(self, hashes=None):
+        """Write the manifest atomically, with a snapshot of the hashes taken by the caller if given."""
+        if hashes is None:
+            # Copy the hashes, a sync may still be updating them on the event loop
+            hashes = dict(self.hashes)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"target": self.target, "model": self.model, "hashes": hashes, "building": self.building}, f)
+        os.replace(tmp_path, self._path)
+
+    def reset(self, target, model=None):
+        """Start over for a new or different index."""
+        self.target = target
+        self.model = model
+        self.hashes = {}